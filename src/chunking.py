@@ -2,10 +2,21 @@ from dataclasses import dataclass
 import re
 from typing import List, Optional, Tuple
 
+import numpy as np
 from unstructured.documents.elements import Element, Table
 
 from .config import MAX_CHARS_NARRATIVE
 
+try:
+    import re2 as _re_engine  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    _re_engine = re
+
+try:
+    from numba import njit  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    njit = None
+
 
 @dataclass
 class BlockMeta:
@@ -31,60 +42,230 @@ class Block:
 BOUNDARY_CATS = {"table", "image", "figure", "pagebreak"}
 TITLE_CATS = {"title", "subtitle", "header"}
 
+_CAT_OTHER, _CAT_BOUNDARY, _CAT_TITLE = 0, 1, 2
+# Raw category spelling -> kind; grows by one entry per new spelling seen.
+_CAT_KIND = {c: _CAT_BOUNDARY for c in BOUNDARY_CATS}
+_CAT_KIND.update({c: _CAT_TITLE for c in TITLE_CATS})
 
-def _get_page(e: Element) -> Optional[int]:
-    """Extract the page number from element metadata."""
 
-    try:
-        md = getattr(e, "metadata", None)
-        pg = getattr(md, "page_number", None) or getattr(md, "page", None)
-        return int(pg) if pg is not None else None
-    except Exception:
-        return None
+def _category_kind(cat: str) -> int:
+    """Classify a raw element category, memoizing each spelling seen."""
 
+    kind = _CAT_KIND.get(cat)
+    if kind is None:
+        kind = _CAT_KIND[cat] = _CAT_KIND.get(cat.lower(), _CAT_OTHER)
+    return kind
 
-def _get_coords(
-    e: Element,
+
+# Everything Python's Unicode ``\s`` (``str.isspace``) matches, spelled out
+# because RE2's ``\s`` is ASCII-only and would stop splitting at e.g. NBSP.
+_SPACE = (
+    "\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000"
+)
+
+# Lookaround-free so it also compiles under RE2: the match spans the terminal
+# punctuation, the whitespace run, and the first character of the next sentence.
+_SENT_RE = _re_engine.compile(f"[.!?][{_SPACE}]+[A-Z(\\[]")
+
+
+def _bbox(
+    coords,
 ) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
-    """Return element bounding box coordinates if available."""
+    """Return ``(x0, y0, x1, y1)`` for a coordinates object or dict."""
 
     try:
-        md = getattr(e, "metadata", None)
-        coords = getattr(md, "coordinates", None)
-        if coords is None:
-            d = getattr(md, "to_dict", lambda: {})()
-            coords = d.get("coordinates")
         pts = getattr(coords, "points", None)
         if pts is None and isinstance(coords, dict):
             pts = coords.get("points")
+        if isinstance(pts, np.ndarray):
+            if pts.ndim != 2 or not pts.shape[0] or pts.shape[1] < 2:
+                return None, None, None, None
+            lo = pts[:, :2].min(axis=0)
+            hi = pts[:, :2].max(axis=0)
+            return float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1])
         if not pts:
             return None, None, None, None
-        xs = []
-        ys = []
+        if len(pts) == 4 and isinstance(pts[0], (tuple, list)):
+            # Common case: a four-corner box of (x, y) pairs.
+            try:
+                (ax, ay), (bx, by), (cx, cy), (dx, dy) = pts
+                ax, bx, cx, dx = float(ax), float(bx), float(cx), float(dx)
+                ay, by, cy, dy = float(ay), float(by), float(cy), float(dy)
+                return (
+                    min(ax, bx, cx, dx),
+                    min(ay, by, cy, dy),
+                    max(ax, bx, cx, dx),
+                    max(ay, by, cy, dy),
+                )
+            except (TypeError, ValueError):
+                pass
+        x0 = y0 = x1 = y1 = None
         for p in pts:
             if isinstance(p, dict):
-                xs.append(float(p.get("x")))
-                ys.append(float(p.get("y")))
+                x = float(p.get("x"))
+                y = float(p.get("y"))
             elif isinstance(p, (list, tuple)) and len(p) >= 2:
-                xs.append(float(p[0]))
-                ys.append(float(p[1]))
-        if not xs or not ys:
-            return None, None, None, None
-        return min(xs), min(ys), max(xs), max(ys)
+                x = float(p[0])
+                y = float(p[1])
+            else:
+                continue
+            if x0 is None:
+                x0 = x1 = x
+                y0 = y1 = y
+                continue
+            if x < x0:
+                x0 = x
+            elif x > x1:
+                x1 = x
+            if y < y0:
+                y0 = y
+            elif y > y1:
+                y1 = y
+        return x0, y0, x1, y1
     except Exception:
         return None, None, None, None
 
 
-def _get_font_size(e: Element) -> Optional[float]:
-    """Return font size if provided in the element metadata."""
+def _bbox_pairs(
+    coords,
+) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+    """``_bbox`` specialised for ``coords.points`` made of (x, y) pairs."""
 
     try:
-        md = getattr(e, "metadata", None)
-        d = getattr(md, "to_dict", lambda: {})()
-        fs = d.get("font_size")
-        return float(fs) if fs is not None else None
+        pts = coords.points
+        if len(pts) == 4:
+            (ax, ay), (bx, by), (cx, cy), (dx, dy) = pts
+            ax, bx, cx, dx = float(ax), float(bx), float(cx), float(dx)
+            ay, by, cy, dy = float(ay), float(by), float(cy), float(dy)
+            return (
+                min(ax, bx, cx, dx),
+                min(ay, by, cy, dy),
+                max(ax, bx, cx, dx),
+                max(ay, by, cy, dy),
+            )
+        it = iter(pts)
+        x, y = next(it)
+        x0 = x1 = float(x)
+        y0 = y1 = float(y)
+        for x, y in it:
+            x = float(x)
+            y = float(y)
+            if x < x0:
+                x0 = x
+            elif x > x1:
+                x1 = x
+            if y < y0:
+                y0 = y
+            elif y > y1:
+                y1 = y
+        return x0, y0, x1, y1
     except Exception:
-        return None
+        return _bbox(coords)
+
+
+def _bbox_dicts(
+    coords,
+) -> Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]:
+    """``_bbox`` specialised for ``coords.points`` made of {"x", "y"} dicts."""
+
+    try:
+        it = iter(coords.points)
+        p = next(it)
+        x0 = x1 = float(p["x"])
+        y0 = y1 = float(p["y"])
+        for p in it:
+            x = float(p["x"])
+            y = float(p["y"])
+            if x < x0:
+                x0 = x
+            elif x > x1:
+                x1 = x
+            if y < y0:
+                y0 = y
+            elif y > y1:
+                y1 = y
+        return x0, y0, x1, y1
+    except Exception:
+        return _bbox(coords)
+
+
+def _select_bbox(elements: List[Element]):
+    """Pick the bbox reader matching the point layout of the first element.
+
+    ``unstructured`` emits one point shape per document, so the choice made
+    for the first element holds for the rest; the specialised readers fall
+    back to ``_bbox`` for anything unexpected.
+    """
+
+    try:
+        first = elements[0].metadata.coordinates.points[0]
+    except Exception:
+        return _bbox
+    if isinstance(first, (tuple, list)):
+        return _bbox_pairs
+    if isinstance(first, dict):
+        return _bbox_dicts
+    return _bbox
+
+
+def _extract_meta(
+    e: Element,
+    bbox=_bbox,
+) -> Tuple[
+    Optional[int],
+    Optional[float],
+    Optional[float],
+    Optional[float],
+    Optional[float],
+    Optional[float],
+]:
+    """Return ``(page, x0, y0, x1, y1, font_size)`` from element metadata.
+
+    Attributes are read directly; ``to_dict()`` is consulted at most once, and
+    only when the metadata object does not expose its coordinates.
+    """
+
+    md = getattr(e, "metadata", None)
+    try:
+        pg = getattr(md, "page_number", None) or getattr(md, "page", None)
+        page = int(pg) if pg is not None else None
+    except Exception:
+        page = None
+
+    d: dict = {}
+    coords = getattr(md, "coordinates", None)
+    if coords is None:
+        try:
+            d = getattr(md, "to_dict", lambda: {})() or {}
+        except Exception:
+            d = {}
+        coords = d.get("coordinates")
+    x0, y0, x1, y1 = bbox(coords)
+
+    try:
+        fs = getattr(md, "font_size", None)
+        if fs is None:
+            fs = d.get("font_size")
+        font_size = float(fs) if fs is not None else None
+    except Exception:
+        font_size = None
+    return page, x0, y0, x1, y1, font_size
+
+
+def _sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """Return ``(start, end)`` offsets of the sentences in stripped text.
+
+    Every span starts on a non-space character and ends on terminal
+    punctuation (or the end of the text), so slices need no further trimming.
+    """
+
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for m in _SENT_RE.finditer(text):
+        spans.append((start, m.start() + 1))
+        start = m.end() - 1
+    spans.append((start, len(text)))
+    return spans
 
 
 def _sentences(text: str) -> List[str]:
@@ -93,8 +274,7 @@ def _sentences(text: str) -> List[str]:
     text = text.strip()
     if not text:
         return []
-    parts = re.split(r"(?<=[.!?])\s+(?=[A-Z(\[])", text)
-    return [p.strip() for p in parts if p.strip()]
+    return [text[a:b] for a, b in _sentence_spans(text)]
 
 
 def _split_by_length(text: str, max_chars: int) -> List[str]:
@@ -102,109 +282,204 @@ def _split_by_length(text: str, max_chars: int) -> List[str]:
 
     if len(text) <= max_chars:
         return [text]
+    if "." not in text and "!" not in text and "?" not in text:
+        # No sentence terminators, so the scanner cannot find a boundary.
+        return [text]
     sents = _sentences(text)
     if not sents:
         return [text[i : i + max_chars] for i in range(0, len(text), max_chars)]
     out: List[str] = []
-    cur = ""
-    for s in sents:
-        if not cur:
-            cur = s
-        elif len(cur) + 1 + len(s) <= max_chars:
-            cur += " " + s
+    parts: List[str] = [sents[0]]
+    cur_len = len(sents[0])
+    for s in sents[1:]:
+        n = len(s)
+        if cur_len + 1 + n <= max_chars:
+            parts.append(s)
+            cur_len += 1 + n
         else:
-            out.append(cur)
-            cur = s
-    if cur:
-        out.append(cur)
+            out.append(" ".join(parts))
+            parts = [s]
+            cur_len = n
+    out.append(" ".join(parts))
     return out
 
 
+def _carry_forward(values: np.ndarray, resets: np.ndarray) -> np.ndarray:
+    """Return, for every position, the last known value strictly before it.
+
+    NaN entries are skipped unless flagged in ``resets``, in which case they
+    clear the carried value (boundary elements overwrite the running state).
+    """
+
+    n = len(values)
+    last = np.where(resets | ~np.isnan(values), np.arange(n), -1)
+    np.maximum.accumulate(last, out=last)
+    prev = np.full(n, np.nan)
+    src = last[:-1]
+    prev[1:] = np.where(src >= 0, values[src], np.nan)
+    return prev
+
+
+def _new_block_mask_np(
+    pages: np.ndarray,
+    y0s: np.ndarray,
+    y1s: np.ndarray,
+    fonts: np.ndarray,
+    boundary: np.ndarray,
+    title: np.ndarray,
+    y_gap: float,
+) -> np.ndarray:
+    """Flag elements (in reading order) that must open a new text block."""
+
+    n = len(pages)
+    prev_y1 = _carry_forward(y1s, boundary)
+    prev_fs = _carry_forward(fonts, boundary)
+    new_page = np.ones(n, dtype=bool)
+    new_page[1:] = pages[1:] != pages[:-1]
+    # fs / prev >= 1.2 rewritten as fs * 5 >= prev * 6 (no division).
+    font_jump = (fonts - prev_fs >= 2.0) | (
+        (prev_fs > 0) & (fonts * 5.0 >= prev_fs * 6.0)
+    )
+    big_gap = (y0s - prev_y1) > y_gap
+    return new_page | title | font_jump | big_gap
+
+
+def _new_block_mask_loop(pages, y0s, y1s, fonts, boundary, title, y_gap):
+    """Scalar equivalent of ``_new_block_mask_np``, written for numba."""
+
+    n = pages.shape[0]
+    mask = np.zeros(n, dtype=np.bool_)
+    prev_y1 = np.nan
+    prev_fs = np.nan
+    for i in range(n):
+        fs = fonts[i]
+        if boundary[i]:
+            prev_y1 = y1s[i]
+            prev_fs = fs
+            continue
+        new = i == 0 or pages[i] != pages[i - 1] or title[i]
+        if not new and not np.isnan(fs) and not np.isnan(prev_fs):
+            if fs - prev_fs >= 2.0 or (prev_fs > 0.0 and fs * 5.0 >= prev_fs * 6.0):
+                new = True
+        if not new and y0s[i] - prev_y1 > y_gap:
+            new = True
+        mask[i] = new
+        if not np.isnan(y1s[i]):
+            prev_y1 = y1s[i]
+        if not np.isnan(fs):
+            prev_fs = fs
+    return mask
+
+
+_new_block_mask = (
+    njit(cache=True)(_new_block_mask_loop) if njit is not None else _new_block_mask_np
+)
+
+
+def _reading_order(pages: np.ndarray, y0s: np.ndarray, x0s: np.ndarray) -> np.ndarray:
+    """Return indices ordering elements by ``(page, y0, x0)``.
+
+    Partitioned output is usually already in reading order; that is detected
+    with one vectorized pass and the sort is skipped.
+    """
+
+    if len(pages) > 1:
+        p0, p1 = pages[:-1], pages[1:]
+        y0, y1 = y0s[:-1], y0s[1:]
+        in_order = (p1 > p0) | (
+            (p1 == p0) & ((y1 > y0) | ((y1 == y0) & (x0s[1:] >= x0s[:-1])))
+        )
+        if in_order.all():
+            return np.arange(len(pages))
+    return np.lexsort((x0s, y0s, pages))
+
+
 def _build_blocks_from_elements(
     elements: List[Element], y_gap_threshold: float = 30.0
 ) -> List[Block]:
     """Coalesce elements into ordered blocks based on spatial cues."""
 
-    blocks: List[Block] = []
-    sortable = []
-    for e in elements:
-        page = _get_page(e)
-        x0, y0, x1, y1 = _get_coords(e)
-        sortable.append(
-            (
-                page or 0,
-                y0 if y0 is not None else 0.0,
-                x0 if x0 is not None else 0.0,
-                e,
-                x0,
-                y0,
-                x1,
-                y1,
-            )
-        )
-    sortable.sort(key=lambda t: (t[0], t[1], t[2]))
+    n = len(elements)
+    if not n:
+        return []
 
+    # Gather element attributes once into parallel columns; sorting and the
+    # new-block decisions then run as array operations.
+    cats: List[str] = []
+    texts: List[str] = []
+    pages: List[int] = []
+    boxes: List[Tuple[Optional[float], ...]] = []
+    fonts: List[Optional[float]] = []
+    boundary = np.empty(n, dtype=bool)
+    title = np.empty(n, dtype=bool)
+    cat_kind = _CAT_KIND
+    bbox = _select_bbox(elements)
+    for i, e in enumerate(elements):
+        cat = getattr(e, "category", "")
+        cats.append(cat)
+        kind = cat_kind.get(cat)
+        if kind is None:
+            kind = _category_kind(cat)
+        texts.append(getattr(e, "text", "") or "")
+        page, x0, y0, x1, y1, font_size = _extract_meta(e, bbox)
+        pages.append(page or 0)
+        boxes.append((x0, y0, x1, y1))
+        fonts.append(font_size)
+        boundary[i] = kind == _CAT_BOUNDARY or isinstance(e, Table)
+        title[i] = kind == _CAT_TITLE
+
+    page_arr = np.array(pages, dtype=np.int64)
+    box_arr = np.array(boxes, dtype=np.float64)
+    font_arr = np.array(fonts, dtype=np.float64)
+    x0s, y0s, y1s = box_arr[:, 0], box_arr[:, 1], box_arr[:, 3]
+    order = _reading_order(page_arr, np.nan_to_num(y0s), np.nan_to_num(x0s))
+
+    bnd = boundary[order]
+    start_new = _new_block_mask(
+        page_arr[order],
+        y0s[order],
+        y1s[order],
+        font_arr[order],
+        bnd,
+        title[order],
+        y_gap_threshold,
+    )
+
+    blocks: List[Block] = []
     cur_text = []
     cur_meta = BlockMeta()
-    prev_page: Optional[int] = None
-    prev_y1: Optional[float] = None
-    prev_font: Optional[float] = None
 
     def flush_cur():
         nonlocal cur_text, cur_meta
         if cur_text:
-            txt = " ".join([t for t in cur_text if t]).strip()
+            txt = " ".join(cur_text).strip()
             if txt:
                 blocks.append(Block(text=txt, category="text", metadata=cur_meta))
         cur_text = []
         cur_meta = BlockMeta()
 
-    for page, y0, x0, e, ex0, ey0, ex1, ey1 in sortable:
-        cat = getattr(e, "category", "").lower()
-        text = getattr(e, "text", "") or ""
-        fs = _get_font_size(e)
-
-        if cat in BOUNDARY_CATS or isinstance(e, Table):
-            flush_cur()
-            bmeta = BlockMeta(
-                page_number=page, x0=ex0, y0=ey0, x1=ex1, y1=ey1, font_size=fs
+    for i, is_boundary, is_new in zip(order.tolist(), bnd.tolist(), start_new.tolist()):
+        text = texts[i]
+        if is_boundary or is_new:
+            ex0, ey0, ex1, ey1 = boxes[i]
+            meta = BlockMeta(
+                page_number=pages[i],
+                x0=ex0,
+                y0=ey0,
+                x1=ex1,
+                y1=ey1,
+                font_size=fonts[i],
             )
-            bcat = "table" if isinstance(e, Table) else (cat or "element")
-            btext = text if bcat == "table" else (text or bcat)
-            blocks.append(Block(text=btext, category=bcat, metadata=bmeta))
-            prev_page, prev_y1, prev_font = page, ey1, fs
-            continue
-
-        start_new = False
-        if prev_page is None or page != prev_page:
-            start_new = True
-        if cat in TITLE_CATS:
-            start_new = True
-        if prev_font is not None and fs is not None:
-            try:
-                if fs - prev_font >= 2.0 or (
-                    prev_font and fs / max(prev_font, 1e-6) >= 1.2
-                ):
-                    start_new = True
-            except Exception:
-                pass
-        if (
-            prev_y1 is not None
-            and ey0 is not None
-            and (ey0 - prev_y1) > y_gap_threshold
-        ):
-            start_new = True
-
-        if start_new:
             flush_cur()
-            cur_meta = BlockMeta(
-                page_number=page, x0=ex0, y0=ey0, x1=ex1, y1=ey1, font_size=fs
-            )
-
-        cur_text.append(text)
-        prev_page = page
-        prev_y1 = ey1 if ey1 is not None else prev_y1
-        prev_font = fs if fs is not None else prev_font
+            if is_boundary:
+                cat = cats[i].lower()
+                bcat = "table" if isinstance(elements[i], Table) else (cat or "element")
+                btext = text if bcat == "table" else (text or bcat)
+                blocks.append(Block(text=btext, category=bcat, metadata=meta))
+                continue
+            cur_meta = meta
+        if text:
+            cur_text.append(text)
 
     flush_cur()
     return blocks
@@ -220,24 +495,23 @@ def _fallback_blocks_pymupdf(pdf_path: Optional[str]) -> List[Block]:
     except Exception:
         return []
     blocks: List[Block] = []
+    append = blocks.append
     try:
-        doc = fitz.open(pdf_path)
-        for pno in range(len(doc)):
-            page = doc[pno]
-            for b in page.get_text("blocks"):
-                if len(b) < 5:
-                    continue
-                x0, y0, x1, y1, txt = b[0], b[1], b[2], b[3], b[4]
-                if not isinstance(txt, str) or not txt.strip():
-                    continue
-                meta = BlockMeta(
-                    page_number=pno + 1,
-                    x0=float(x0),
-                    y0=float(y0),
-                    x1=float(x1),
-                    y1=float(y1),
-                )
-                blocks.append(Block(text=txt.strip(), category="text", metadata=meta))
+        with fitz.open(pdf_path) as doc:
+            for pno, page in enumerate(doc, start=1):
+                # "blocks" yields (x0, y0, x1, y1, text, block_no, block_type).
+                for x0, y0, x1, y1, txt, *_ in page.get_text("blocks"):
+                    txt = txt.strip()
+                    if not txt:
+                        continue
+                    meta = BlockMeta(
+                        page_number=pno,
+                        x0=float(x0),
+                        y0=float(y0),
+                        x1=float(x1),
+                        y1=float(y1),
+                    )
+                    append(Block(text=txt, category="text", metadata=meta))
     except Exception:
         pass
     return blocks
@@ -256,19 +530,24 @@ def chunk_elements(
         blocks = _fallback_blocks_pymupdf(pdf_path)
 
     out: List[Block] = []
+    # Hot loop: bind globals and loop invariants to locals once.
+    append = out.append
+    split = _split_by_length
+    boundary_cats = BOUNDARY_CATS
     max_chars = MAX_CHARS_NARRATIVE
+    table_max_chars = max(800, int(0.6 * max_chars))
     for b in blocks:
-        if b.category in BOUNDARY_CATS or b.category == "table":
-            if b.category == "table" and b.text.strip():
-                for t in _split_by_length(
-                    b.text.strip(), max_chars=max(800, int(0.6 * max_chars))
-                ):
-                    out.append(Block(text=t, category="table", metadata=b.metadata))
+        cat = b.category
+        if cat in boundary_cats or cat == "table":
+            if cat == "table":
+                txt = b.text.strip()
+                if txt:
+                    for t in split(txt, max_chars=table_max_chars):
+                        append(Block(text=t, category="table", metadata=b.metadata))
             continue
         txt = b.text.strip()
         if not txt:
             continue
-        parts = _split_by_length(txt, max_chars=max_chars)
-        for p in parts:
-            out.append(Block(text=p, category="text", metadata=b.metadata))
+        for p in split(txt, max_chars=max_chars):
+            append(Block(text=p, category="text", metadata=b.metadata))
     return out
@@ -27,26 +27,68 @@ METADATA_JSONL = DOMAINDATA_DIR / "metadata.jsonl"
 
 STORAGE_DIR = ROOT / "storage"
 CHROMA_DIR = STORAGE_DIR / "chroma"
+# "persistent" opens CHROMA_DIR in-process; "http" talks to a Chroma server.
+CHROMA_TRANSPORT = os.getenv("CHROMA_TRANSPORT", "persistent")
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+# "chroma" or "faiss" (HNSW over int8 scalar-quantized vectors in FAISS_DIR).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+FAISS_DIR = STORAGE_DIR / "faiss"
 ASSET_DIR = STORAGE_DIR / "assets"
 ASSET_DB_PATH = ASSET_DIR / "assets.sqlite"
+EMBED_CACHE_PATH = STORAGE_DIR / "embeddings.sqlite"
 
 GEMINI_GENERATE_MODEL = os.getenv("GEMINI_GENERATE_MODEL", "gemini-2.0-flash")
 SENTENCE_TRANSFORMER_MODEL = os.getenv(
     "SENTENCE_TRANSFORMER_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
 )
 SENTENCE_TRANSFORMER_DEVICE = os.getenv("SENTENCE_TRANSFORMER_DEVICE")
+SENTENCE_TRANSFORMER_BACKEND = os.getenv("SENTENCE_TRANSFORMER_BACKEND", "torch")
+SENTENCE_TRANSFORMER_QUANTIZE = env_bool("SENTENCE_TRANSFORMER_QUANTIZE", False)
+SENTENCE_TRANSFORMER_COMPILE = env_bool("SENTENCE_TRANSFORMER_COMPILE", False)
+SENTENCE_TRANSFORMER_HALF = env_bool("SENTENCE_TRANSFORMER_HALF", False)
+# Intra-op threads for CPU inference; 0 keeps PyTorch's default.
+SENTENCE_TRANSFORMER_THREADS = int(os.getenv("SENTENCE_TRANSFORMER_THREADS", "0"))
+SENTENCE_TRANSFORMER_BATCH_SIZE = int(
+    os.getenv("SENTENCE_TRANSFORMER_BATCH_SIZE", "64")
+)
+# Window for merging concurrent embedding calls (e.g. parallel /ask
+# requests, whose retrieval runs in worker threads) into one model batch.
+# Every batch waits this long, so 0 (off) suits anything but concurrent load.
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "0"))
+EMBED_CACHE = env_bool("EMBED_CACHE", True)
+EMBED_CACHE_INT8 = env_bool("EMBED_CACHE_INT8", False)
+EMBED_CACHE_MEMORY_SIZE = int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "4096"))
+# Inputs at least this long are sharded across all visible GPUs when there
+# is more than one; 0 disables multi-GPU encoding.
+EMBED_MULTI_GPU_MIN_TEXTS = int(os.getenv("EMBED_MULTI_GPU_MIN_TEXTS", "1024"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+# Reuse the results of a cached query whose embedding has at least this
+# cosine similarity to the new one (e.g. 0.97); 0 disables the semantic tier.
+QUERY_CACHE_SIMILARITY = float(os.getenv("QUERY_CACHE_SIMILARITY", "0"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "eng")
 USE_OCR = env_bool("USE_OCR", True)
 HI_RES_STRATEGY = os.getenv("HI_RES_STRATEGY", "hi_res")
+# Partition PDFs whose first pages already carry at least this many characters
+# of embedded text with the "fast" strategy (no layout model, OCR, image or
+# table extraction). 0 keeps HI_RES_STRATEGY for every PDF.
+FAST_STRATEGY_TEXT_MIN_CHARS = int(os.getenv("FAST_STRATEGY_TEXT_MIN_CHARS", "0"))
 MAX_CHARS_NARRATIVE = int(os.getenv("MAX_CHARS_NARRATIVE", "1600"))
 MAX_CHARS_SLIDEY = int(os.getenv("MAX_CHARS_SLIDEY", "900"))
 COMBINE_UNDER_N_CHARS = int(os.getenv("COMBINE_UNDER_N_CHARS", "500"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))
+# Every parse worker loads its own layout model, so the pool stays small.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+# PyTorch/OpenMP threads per parse worker; 0 splits the cores between workers.
+INGEST_WORKER_THREADS = int(os.getenv("INGEST_WORKER_THREADS", "0"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
 
 TOP_K = int(os.getenv("TOP_K", "6"))
 MAX_ASSET_ATTACH = int(os.getenv("MAX_ASSET_ATTACH", "4"))
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
 
 TIMEOUT_SECONDS = int(os.getenv("TIMEOUT_SECONDS", "60"))
 DEBUG = env_bool("DEBUG", True)
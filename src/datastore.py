@@ -4,15 +4,52 @@ import json
 import shutil
 import sqlite3
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Set
 
 from .config import ASSET_DB_PATH, ASSET_DIR, STORAGE_DIR
 from .logging_utils import get_logger
 
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
 logger = get_logger(__name__)
 
+_json_loads = orjson.loads if orjson else json.loads
+
+
+def _json_dumps(value) -> str:
+    """Serialize a value to a JSON string, preferring orjson when available."""
+
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def asset_path(
+    doc_id: str, page: Optional[int], name: str, created: Optional[Set[Path]] = None
+) -> Path:
+    """Return the filesystem path where an asset should be stored.
+
+    Needs no database connection, so ingestion workers in other processes
+    can write asset files before handing the records back for persistence.
+    ``created`` is the caller's memo of directories already made, so each
+    is created once per memo instead of on every call.
+    """
+
+    base = ASSET_DIR / doc_id
+    if page is not None:
+        base = base / f"page-{page:04d}"
+    if created is None or base not in created:
+        base.mkdir(parents=True, exist_ok=True)
+        if created is not None:
+            created.add(base)
+    return base / name
+
 
 @dataclass
 class Asset:
@@ -30,10 +67,27 @@ class Asset:
 class AssetStore:
     """Lightweight wrapper over SQLite for asset persistence."""
 
+    SCHEMA_VERSION = 1
+    _INSERT_ASSET_SQL = """
+        INSERT OR REPLACE INTO assets(asset_id, doc_id, page, type, file_path, text_json, extra_json, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    _SELECT_ASSETS_SQL = (
+        "SELECT asset_id, doc_id, type, page, file_path, text_json, extra_json"
+        " FROM assets WHERE doc_id=?"
+    )
+
     def __init__(self, db_path: Path = ASSET_DB_PATH):
         self.db_path = self._prepare_db_path(db_path)
         self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
         self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute("PRAGMA temp_store=MEMORY;")
+        self.conn.execute("PRAGMA cache_size=-65536;")
+        self._cur = self.conn.cursor()
+        self._batch_depth = 0
+        self._created_dirs: Set[Path] = set()
         self.ensure_schema()
 
     @staticmethod
@@ -55,10 +109,35 @@ class AssetStore:
 
         self.conn.close()
 
+    @contextmanager
+    def batch(self) -> Iterator["AssetStore"]:
+        """Group writes into a single transaction committed on exit."""
+
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.conn.rollback()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self.conn.commit()
+
+    def _commit(self) -> None:
+        """Commit immediately unless writes are being grouped by ``batch``."""
+
+        if not self._batch_depth:
+            self.conn.commit()
+
     def ensure_schema(self) -> None:
-        """Create required tables and indexes if they do not exist."""
+        """Create required tables and indexes unless the schema is current."""
 
-        cur = self.conn.cursor()
+        cur = self._cur
+        (version,) = cur.execute("PRAGMA user_version").fetchone()
+        if version >= self.SCHEMA_VERSION:
+            return
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS documents (
@@ -95,7 +174,11 @@ class AssetStore:
             """
         )
         cur.execute("CREATE INDEX IF NOT EXISTS idx_assets_doc ON assets(doc_id)")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_assets_doc_page ON assets(doc_id, page)"
+        )
         cur.execute("CREATE INDEX IF NOT EXISTS idx_failures_doc ON failures(doc_id)")
+        cur.execute(f"PRAGMA user_version={int(self.SCHEMA_VERSION)}")
         self.conn.commit()
 
     def record_document(
@@ -103,7 +186,7 @@ class AssetStore:
     ) -> None:
         """Insert or update document metadata."""
 
-        cur = self.conn.cursor()
+        cur = self._cur
         cur.execute(
             """
             INSERT OR REPLACE INTO documents(doc_id, source_path, title, metadata_json, created_at)
@@ -113,38 +196,50 @@ class AssetStore:
                 doc_id,
                 str(source_path),
                 title or "",
-                json.dumps(metadata or {}),
+                _json_dumps(metadata or {}),
                 int(time.time()),
             ),
         )
-        self.conn.commit()
+        self._commit()
+
+    @staticmethod
+    def _asset_row(asset: Asset, created_at: int) -> tuple:
+        """Return the ``assets`` table row for an asset."""
+
+        return (
+            asset.asset_id,
+            asset.doc_id,
+            asset.page if asset.page is not None else None,
+            asset.type,
+            asset.file_path,
+            _json_dumps(asset.text_json or {}),
+            _json_dumps(asset.extra_json or {}),
+            created_at,
+        )
 
     def save_asset(self, asset: Asset) -> None:
         """Persist an asset entry."""
 
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT OR REPLACE INTO assets(asset_id, doc_id, page, type, file_path, text_json, extra_json, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                asset.asset_id,
-                asset.doc_id,
-                asset.page if asset.page is not None else None,
-                asset.type,
-                asset.file_path,
-                json.dumps(asset.text_json or {}),
-                json.dumps(asset.extra_json or {}),
-                int(time.time()),
-            ),
+        cur = self._cur
+        cur.execute(self._INSERT_ASSET_SQL, self._asset_row(asset, int(time.time())))
+        self._commit()
+
+    def save_assets(self, assets: List[Asset]) -> None:
+        """Persist several asset entries with a single statement and commit."""
+
+        if not assets:
+            return
+        now = int(time.time())
+        cur = self._cur
+        cur.executemany(
+            self._INSERT_ASSET_SQL, [self._asset_row(a, now) for a in assets]
         )
-        self.conn.commit()
+        self._commit()
 
     def record_failure(self, doc_id: str, source_path: Path, reason: str) -> None:
         """Track ingestion failures for later inspection."""
 
-        cur = self.conn.cursor()
+        cur = self._cur
         cur.execute(
             """
             INSERT INTO failures(doc_id, source_path, reason, created_at)
@@ -152,36 +247,29 @@ class AssetStore:
             """,
             (doc_id, str(source_path), reason[:1000], int(time.time())),
         )
-        self.conn.commit()
+        self._commit()
 
     def get_assets_for_doc(self, doc_id: str) -> List[Asset]:
         """Return all assets associated with a document."""
 
-        cur = self.conn.cursor()
-        rows = cur.execute(
-            "SELECT asset_id, doc_id, type, page, file_path, text_json, extra_json FROM assets WHERE doc_id=?",
-            (doc_id,),
-        ).fetchall()
-        assets: List[Asset] = []
-        for asset_id, doc, typ, page, file_path, text_json, extra_json in rows:
-            assets.append(
-                Asset(
-                    asset_id=asset_id,
-                    doc_id=doc,
-                    type=typ,
-                    page=page,
-                    file_path=file_path,
-                    text_json=json.loads(text_json) if text_json else None,
-                    extra_json=json.loads(extra_json) if extra_json else None,
-                )
+        cur = self._cur
+        rows = cur.execute(self._SELECT_ASSETS_SQL, (doc_id,)).fetchall()
+        return [
+            Asset(
+                asset_id=row["asset_id"],
+                doc_id=row["doc_id"],
+                type=row["type"],
+                page=row["page"],
+                file_path=row["file_path"],
+                text_json=_json_loads(row["text_json"]) if row["text_json"] else None,
+                extra_json=(
+                    _json_loads(row["extra_json"]) if row["extra_json"] else None
+                ),
             )
-        return assets
+            for row in rows
+        ]
 
     def asset_path(self, doc_id: str, page: Optional[int], name: str) -> Path:
         """Return the filesystem path where an asset should be stored."""
 
-        base = ASSET_DIR / doc_id
-        if page is not None:
-            base = base / f"page-{page:04d}"
-        base.mkdir(parents=True, exist_ok=True)
-        return base / name
+        return asset_path(doc_id, page, name, self._created_dirs)
@@ -1,62 +1,161 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import multiprocessing
+import os
+import queue
 import re
+import shutil
+import struct
+import tempfile
+import threading
 import uuid
+from itertools import count, islice
 from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 from unstructured.documents.elements import Element, Table
 from unstructured.partition.pdf import partition_pdf
 
 from src.config import (
     DATA_DIRS,
+    EMBED_BATCH_SIZE,
+    FAST_STRATEGY_TEXT_MIN_CHARS,
     HI_RES_STRATEGY,
+    INGEST_QUEUE_SIZE,
+    INGEST_WORKERS,
+    INGEST_WORKER_THREADS,
     METADATA_JSONL,
     OCR_LANGUAGES,
     USE_OCR,
 )
 from src.chunking import Block, chunk_elements
-from src.datastore import Asset, AssetStore
+from src.datastore import Asset, AssetStore, asset_path
 from src.logging_utils import get_logger
-from src.vectorstore import VectorStore
+from src.search import metadata_flag
+from src.vectorstore import AsyncVectorStore, VectorStore, open_vector_store
 
 logger = get_logger(__name__)
 
 _ALLOWED_META_TYPES = (str, int, float, bool)
+_SCALAR_META_TYPES = frozenset(_ALLOWED_META_TYPES)
 MIN_IMAGE_PIXELS = 100 * 100
 MIN_IMAGE_BYTES = 4 * 1024
 MAX_ASPECT_RATIO = 6.0
+_STOP = object()
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_UUID_RE = re.compile(r"[0-9a-fA-F-]{32,36}")
+_TEXT_PROBE_PAGES = 3
 
 try:
     from PIL import Image as PILImage  # type: ignore
 except Exception:  # pragma: no cover - optional dependency
     PILImage = None  # type: ignore
 
+try:
+    import orjson
+except Exception:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
 
-def _should_keep_image(path: Path) -> bool:
-    """Return True if an extracted image appears meaningful enough to retain."""
+_json_loads = orjson.loads if orjson else json.loads
+
+
+def _fast_image_dims(path: Path) -> Optional[Tuple[int, int]]:
+    """Read ``(width, height)`` from PNG or JPEG headers without decoding pixels."""
+
+    try:
+        with path.open("rb") as f:
+            head = f.read(32)
+            if head.startswith(_PNG_SIGNATURE) and head[12:16] == b"IHDR":
+                width, height = struct.unpack(">II", head[16:24])
+                return width, height
+            if not head.startswith(b"\xff\xd8"):
+                return None
+            f.seek(2)
+            while True:
+                byte = f.read(1)
+                while byte and byte != b"\xff":
+                    byte = f.read(1)
+                while byte == b"\xff":
+                    byte = f.read(1)
+                if not byte:
+                    return None
+                marker = byte[0]
+                if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                    continue
+                seg = f.read(2)
+                if len(seg) < 2:
+                    return None
+                (length,) = struct.unpack(">H", seg)
+                if marker in _JPEG_SOF_MARKERS:
+                    sof = f.read(5)
+                    if len(sof) < 5:
+                        return None
+                    height, width = struct.unpack(">HH", sof[1:5])
+                    return width, height
+                f.seek(length - 2, 1)
+    except (OSError, struct.error):
+        return None
+
+
+class _ImageProbe(NamedTuple):
+    """File size and, when readable, pixel dimensions of an image on disk."""
+
+    size: int
+    width: Optional[int]
+    height: Optional[int]
+
+
+def _probe_image(path: Path) -> Optional[_ImageProbe]:
+    """Stat an image and read its dimensions; ``None`` if it is missing."""
 
     try:
-        if path.stat().st_size < MIN_IMAGE_BYTES:
-            return False
+        size = path.stat().st_size
     except OSError:
-        return False
-    if PILImage:
+        return None
+    if size < MIN_IMAGE_BYTES:
+        return _ImageProbe(size, None, None)
+    dims = _fast_image_dims(path)
+    if dims is None and PILImage:
         try:
             with PILImage.open(path) as im:
-                width, height = im.size
+                dims = im.size
         except Exception:
-            return True
-        if not width or not height:
-            return False
-        if (width * height) < MIN_IMAGE_PIXELS:
-            return False
-        aspect_ratio = max(width / height, height / width)
-        if aspect_ratio > MAX_ASPECT_RATIO:
-            return False
-    return True
+            dims = None
+    width, height = dims if dims is not None else (None, None)
+    return _ImageProbe(size, width, height)
+
+
+def _dims_acceptable(width: Optional[int], height: Optional[int]) -> bool:
+    """Return True unless known dimensions are too small or too elongated."""
+
+    if width is None or height is None:
+        return True
+    if not width or not height:
+        return False
+    if (width * height) < MIN_IMAGE_PIXELS:
+        return False
+    aspect_ratio = max(width / height, height / width)
+    return aspect_ratio <= MAX_ASPECT_RATIO
+
+
+def _keep_probe(probe: Optional[_ImageProbe]) -> bool:
+    """Apply the size and dimension thresholds to an image probe."""
+
+    if probe is None or probe.size < MIN_IMAGE_BYTES:
+        return False
+    return _dims_acceptable(probe.width, probe.height)
+
+
+def _should_keep_image(path: Path) -> bool:
+    """Return True if an extracted image appears meaningful enough to retain."""
+
+    return _keep_probe(_probe_image(path))
 
 
 def _sanitize_metadata_value(value):
@@ -84,7 +183,30 @@ def _sanitize_metadata_value(value):
 def _sanitize_metadata(metadata: dict) -> dict:
     """Normalize metadata values for storage."""
 
-    return {k: _sanitize_metadata_value(v) for k, v in metadata.items()}
+    # Exact type checks keep plain scalars, the common case, off the
+    # recursive path; subclasses still go through _sanitize_metadata_value.
+    scalar_types = _SCALAR_META_TYPES
+    return {
+        k: v if v is None or type(v) in scalar_types else _sanitize_metadata_value(v)
+        for k, v in metadata.items()
+    }
+
+
+def _metadata_flags(meta: dict) -> Dict[str, bool]:
+    """Return the per-value filter flags for a document's list-valued metadata."""
+
+    flags: Dict[str, bool] = {}
+    for field in ("industries", "country_codes"):
+        value = meta.get(field)
+        if value is None:
+            continue
+        items = (
+            value if isinstance(value, (list, tuple, set)) else str(value).split(",")
+        )
+        for item in items:
+            if item is not None and str(item).strip():
+                flags[metadata_flag(field, str(item))] = True
+    return flags
 
 
 def load_metadata(path: Path) -> Dict[str, dict]:
@@ -94,13 +216,12 @@ def load_metadata(path: Path) -> Dict[str, dict]:
     if not path.exists():
         logger.warning(f"Metadata file not found at {path}")
         return meta
-    with path.open("r", encoding="utf-8") as f:
+    with path.open("rb") as f:
         for line in f:
-            line = line.strip()
-            if not line:
+            if line.isspace():
                 continue
             try:
-                obj = json.loads(line)
+                obj = _json_loads(line)
                 uuid_str = obj.get("uuid")
                 if uuid_str:
                     meta[uuid_str] = obj
@@ -112,8 +233,16 @@ def load_metadata(path: Path) -> Dict[str, dict]:
 def guess_doc_id(path: Path) -> str:
     """Return a stable document identifier derived from the file path."""
 
+    return _guess_doc_id_cached(str(path))
+
+
+@lru_cache(maxsize=16384)
+def _guess_doc_id_cached(path_str: str) -> str:
+    """Derive the document id for a path string, resolving it at most once."""
+
+    path = Path(path_str)
     stem = path.stem
-    if re.fullmatch(r"[0-9a-fA-F-]{32,36}", stem):
+    if _UUID_RE.fullmatch(stem):
         return stem.lower()
     return uuid.uuid5(uuid.NAMESPACE_URL, str(path.resolve()).replace("\\", "/")).hex
 
@@ -141,19 +270,30 @@ def element_image_path(e: Element) -> Optional[Path]:
 
 
 def save_image_asset_from_element(
-    e: Element, store: AssetStore, doc_id: str, pg: Optional[int]
+    e: Element,
+    doc_id: str,
+    pg: Optional[int],
+    seq: Iterator[int],
+    created_dirs: Optional[Set[Path]] = None,
 ) -> Optional[Asset]:
-    """Persist an image element to disk and register it in the asset store."""
+    """Write an image element to disk and return its asset record.
 
+    ``seq`` is the document's id counter; the next value becomes the hex
+    suffix of the asset id and of any generated file name. ``created_dirs``
+    is the document's memo of asset directories already created.
+    """
+
+    suffix = format(next(seq), "08x")
     img_path = element_image_path(e)
-    if img_path and img_path.exists():
-        if not _should_keep_image(img_path):
+    probe = _probe_image(img_path) if img_path else None
+    if probe is not None:
+        if not _keep_probe(probe):
             return None
-        target = store.asset_path(doc_id, pg, img_path.name)
+        target = asset_path(doc_id, pg, img_path.name, created_dirs)
         try:
-            target.write_bytes(img_path.read_bytes())
+            shutil.copyfile(img_path, target)
             return Asset(
-                asset_id=f"{doc_id}::img::{uuid.uuid4().hex}",
+                asset_id=f"{doc_id}::img::{suffix}",
                 doc_id=doc_id,
                 type="image",
                 page=pg,
@@ -166,20 +306,16 @@ def save_image_asset_from_element(
     try:
         im = getattr(e, "image", None)
         if im is not None:
-            target = store.asset_path(doc_id, pg, f"image-{uuid.uuid4().hex}.png")
+            target = asset_path(doc_id, pg, f"image-{suffix}.png", created_dirs)
             try:
                 from PIL import Image
 
+                dims_checked = False
                 if isinstance(im, Image.Image):
-                    width, height = im.size
-                    if width * height < MIN_IMAGE_PIXELS:
-                        return None
-                    aspect_ratio = (
-                        max(width / height, height / width) if width and height else 0
-                    )
-                    if aspect_ratio > MAX_ASPECT_RATIO:
+                    if not _dims_acceptable(*im.size):
                         return None
                     im.save(str(target))
+                    dims_checked = True
                 elif isinstance(im, (bytes, bytearray)):
                     Path(target).write_bytes(im)
                 else:
@@ -187,11 +323,15 @@ def save_image_asset_from_element(
                         im.save(str(target))
                     else:
                         raise ValueError("Unsupported image object")
-                if not _should_keep_image(target):
+                if dims_checked:
+                    keep = target.stat().st_size >= MIN_IMAGE_BYTES
+                else:
+                    keep = _should_keep_image(target)
+                if not keep:
                     target.unlink(missing_ok=True)
                     return None
                 return Asset(
-                    asset_id=f"{doc_id}::img::{uuid.uuid4().hex}",
+                    asset_id=f"{doc_id}::img::{suffix}",
                     doc_id=doc_id,
                     type="image",
                     page=pg,
@@ -212,13 +352,13 @@ def save_image_asset_from_element(
             import base64
 
             raw = base64.b64decode(b64)
-            target = store.asset_path(doc_id, pg, f"image-{uuid.uuid4().hex}.png")
+            target = asset_path(doc_id, pg, f"image-{suffix}.png", created_dirs)
             Path(target).write_bytes(raw)
             if not _should_keep_image(target):
                 target.unlink(missing_ok=True)
                 return None
             return Asset(
-                asset_id=f"{doc_id}::img::{uuid.uuid4().hex}",
+                asset_id=f"{doc_id}::img::{suffix}",
                 doc_id=doc_id,
                 type="image",
                 page=pg,
@@ -231,6 +371,31 @@ def save_image_asset_from_element(
     return None
 
 
+def _iter_pdfs(base: str) -> Iterator[str]:
+    """Yield PDF file paths beneath ``base`` using ``os.scandir``.
+
+    Like ``Path.rglob``, symlinked directories are not descended into and
+    unreadable directories are skipped.
+    """
+
+    stack = [base]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    stack.append(entry.path)
+                elif entry.name.endswith(".pdf"):
+                    yield entry.path
+
+
 def walk_pdfs(data_dirs: List[Path]) -> List[Path]:
     """Collect all PDF paths beneath the configured data directories."""
 
@@ -238,35 +403,124 @@ def walk_pdfs(data_dirs: List[Path]) -> List[Path]:
     for base in data_dirs:
         if not base.exists():
             continue
-        for p in base.rglob("*.pdf"):
-            pdfs.append(p)
+        pdfs.extend(map(Path, _iter_pdfs(str(base))))
     return sorted(pdfs)
 
 
+class PartitionError(RuntimeError):
+    """Raised when ``partition_pdf`` cannot parse a document."""
+
+
 def process_pdf(
-    path: Path, meta_map: Dict[str, dict], vs: VectorStore, store: AssetStore
-):
-    """Process a single PDF into indexed chunks and persisted assets."""
+    path: Path, meta_map: Dict[str, dict], store: AssetStore
+) -> Tuple[List[str], List[str], List[dict]]:
+    """Process a single PDF into persisted assets and chunks ready for indexing.
+
+    Returns ``(ids, documents, metadatas)``; upserting them is left to the
+    caller so embeddings can be batched across documents.
+    """
 
     doc_id = guess_doc_id(path)
     meta = meta_map.get(doc_id, {})
     logger.info(f"Processing {path.name} as doc_id={doc_id}")
 
     try:
-        elements: List[Element] = partition_pdf(
-            filename=str(path),
-            strategy=HI_RES_STRATEGY,
-            extract_images_in_pdf=True,
-            infer_table_structure=True,
-            ocr_languages=OCR_LANGUAGES if USE_OCR else None,
-        )
-    except Exception as e:
+        ids, docs, metas, assets = process_pdf_parse(path, meta)
+    except PartitionError as e:
         logger.error(f"partition_pdf failed for {path}: {e}")
         store.record_failure(doc_id, path, f"partition_pdf error: {e}")
-        return
+        return [], [], []
+    persist_document(store, path, meta, assets)
+    return ids, docs, metas
 
-    store.record_document(doc_id, path, title=None, metadata=meta)
 
+def _has_text_layer(path: Path, min_chars: int) -> bool:
+    """Return True if the first pages embed at least ``min_chars`` of text."""
+
+    try:
+        from PyPDF2 import PdfReader
+    except Exception:
+        return False
+    try:
+        reader = PdfReader(str(path))
+        n_chars = 0
+        for page in reader.pages[:_TEXT_PROBE_PAGES]:
+            n_chars += len((page.extract_text() or "").strip())
+            if n_chars >= min_chars:
+                return True
+    except Exception:
+        return False
+    return False
+
+
+def partition_document(path: Path, image_dir: Optional[Path] = None) -> List[Element]:
+    """Partition a PDF into layout elements with the configured strategy.
+
+    Born-digital PDFs are routed to the ``fast`` strategy when
+    ``FAST_STRATEGY_TEXT_MIN_CHARS`` is set and the text probe passes.
+    Extracted figures are written to ``image_dir`` (unstructured's default
+    is a shared ``figures/`` directory in the working directory).
+    """
+
+    strategy = HI_RES_STRATEGY
+    if FAST_STRATEGY_TEXT_MIN_CHARS > 0 and _has_text_layer(
+        path, FAST_STRATEGY_TEXT_MIN_CHARS
+    ):
+        strategy = "fast"
+        logger.debug(f"Using fast strategy for text-based PDF {path.name}")
+    return partition_pdf(
+        filename=str(path),
+        strategy=strategy,
+        extract_images_in_pdf=True,
+        extract_image_block_output_dir=str(image_dir) if image_dir else None,
+        infer_table_structure=True,
+        ocr_languages=OCR_LANGUAGES if USE_OCR else None,
+    )
+
+
+def persist_document(
+    store: AssetStore, path: Path, meta: dict, assets: List[Asset]
+) -> None:
+    """Record a parsed document and its assets in a single transaction."""
+
+    with store.batch():
+        store.record_document(guess_doc_id(path), path, title=None, metadata=meta)
+        store.save_assets(assets)
+
+
+def process_pdf_parse(
+    path: Path, meta: dict
+) -> Tuple[List[str], List[str], List[dict], List[Asset]]:
+    """Partition a PDF and build its chunks and asset records.
+
+    Touches neither the vector store nor the asset database, so it can run
+    in a worker process: image files are written to the asset directory
+    here, while the returned ``Asset`` records are left for the caller to
+    persist. Partitioning failures are raised as ``PartitionError``.
+    """
+
+    # Figures go to a private directory, since unstructured names them
+    # figure-<page>-<n> for every PDF; kept images are copied out of it.
+    with tempfile.TemporaryDirectory(prefix="ingest-figures-") as image_dir:
+        return _parse_elements(path, meta, Path(image_dir))
+
+
+def _parse_elements(
+    path: Path, meta: dict, image_dir: Path
+) -> Tuple[List[str], List[str], List[dict], List[Asset]]:
+    """Body of ``process_pdf_parse`` with figures extracted to ``image_dir``."""
+
+    doc_id = guess_doc_id(path)
+    try:
+        elements = partition_document(path, image_dir)
+    except Exception as e:
+        raise PartitionError(str(e)) from e
+
+    # Chunk and asset ids are prefixed with doc_id, so a per-document
+    # counter keeps them unique without drawing from os.urandom.
+    seq = count()
+    created_dirs: Set[Path] = set()
+    meta_flags = _metadata_flags(meta)
     chunk_texts: List[str] = []
     chunk_ids: List[str] = []
     chunk_metas: List[dict] = []
@@ -277,14 +531,28 @@ def process_pdf(
     image_assets_by_element: Dict[int, str] = {}
     page_table_assets: Dict[int, List[str]] = defaultdict(list)
     page_image_assets: Dict[int, List[str]] = defaultdict(list)
+    assets: List[Asset] = []
+    # Category and page are resolved once per element and reused by the
+    # fallback grouping below.
+    cats: List[str] = []
+    pages: List[Optional[int]] = []
     for e in elements:
-        pg = element_page(e)
+        try:
+            md = getattr(e, "metadata", None)
+            pg = getattr(md, "page_number", None)
+            if pg is None:
+                pg = getattr(md, "page", None)
+            pg = int(pg) if pg is not None else None
+        except Exception:
+            pg = None
         cat = getattr(e, "category", "").lower()
+        cats.append(cat)
+        pages.append(pg)
         page_key = pg if pg is not None else -1
 
         if isinstance(e, Table):
             table_text = e.text or ""
-            asset_id = f"{doc_id}::tbl::{uuid.uuid4().hex}"
+            asset_id = f"{doc_id}::tbl::{next(seq):08x}"
             asset = Asset(
                 asset_id=asset_id,
                 doc_id=doc_id,
@@ -294,33 +562,36 @@ def process_pdf(
                 text_json={"text": table_text},
                 extra_json={"category": cat},
             )
-            store.save_asset(asset)
+            assets.append(asset)
             table_assets_by_element[id(e)] = asset_id
             page_table_assets[page_key].append(asset_id)
             n_tbl += 1
         elif cat in {"image", "figure"}:
-            asset = save_image_asset_from_element(e, store, doc_id, pg)
+            asset = save_image_asset_from_element(e, doc_id, pg, seq, created_dirs)
             if asset:
-                store.save_asset(asset)
+                assets.append(asset)
                 image_assets_by_element[id(e)] = asset.asset_id
                 page_image_assets[page_key].append(asset.asset_id)
                 n_img += 1
 
+    page_table_csv = {k: ",".join(v) for k, v in page_table_assets.items()}
+    page_image_csv = {k: ",".join(v) for k, v in page_image_assets.items()}
+
     chunks = chunk_elements(elements, pdf_path=str(path))
     if not chunks:
         logger.warning(
             f"No layout chunks for {doc_id}; falling back to naive text grouping"
         )
-        page_to_text: Dict[int, List[str]] = {}
-        for e in elements:
-            cat = getattr(e, "category", "").lower()
+        page_to_text: Dict[int, List[str]] = defaultdict(list)
+        for e, cat, pg in zip(elements, cats, pages):
             if isinstance(e, Table) or cat in {"image", "figure"}:
                 continue
             t = getattr(e, "text", "") or ""
             if not t.strip():
                 continue
-            pg = element_page(e) or 0
-            page_to_text.setdefault(pg, []).append(t)
+            page_to_text[pg or 0].append(t)
+        # Elements arrive in page order, so this is a linear timsort pass; it
+        # only reorders pages when elements without a page map to page 0.
         for pg, parts in sorted(page_to_text.items()):
             txt = " ".join(parts).strip()
             if txt:
@@ -341,7 +612,7 @@ def process_pdf(
             pg = element_page(ch)
             cat = getattr(ch, "category", "").lower()
             text = getattr(ch, "text", "") or ""
-        ch_id = f"{doc_id}::pg{pg or 0}::{uuid.uuid4().hex}"
+        ch_id = f"{doc_id}::pg{pg or 0}::{next(seq):08x}"
         page_key = pg if pg is not None else -1
         asset_id: Optional[str] = None
 
@@ -378,13 +649,16 @@ def process_pdf(
         }
         if asset_id:
             metadata["asset_id"] = asset_id
-        if page_table_assets.get(page_key):
-            metadata["table_asset_ids"] = ",".join(page_table_assets[page_key])
-        if page_image_assets.get(page_key):
-            metadata["image_asset_ids"] = ",".join(page_image_assets[page_key])
+        table_csv = page_table_csv.get(page_key)
+        if table_csv:
+            metadata["table_asset_ids"] = table_csv
+        image_csv = page_image_csv.get(page_key)
+        if image_csv:
+            metadata["image_asset_ids"] = image_csv
         for k in ("industries", "date", "country_codes"):
             if k in meta:
                 metadata[k] = meta[k]
+        metadata.update(meta_flags)
         if "date" in meta and "date_ts" not in metadata:
             try:
                 metadata["date_ts"] = int(str(meta["date"]))
@@ -397,32 +671,255 @@ def process_pdf(
         chunk_metas.append(metadata)
 
     if chunk_texts:
-        try:
-            vs.upsert(ids=chunk_ids, documents=chunk_texts, metadatas=chunk_metas)
-            logger.info(
-                f"Indexed {len(chunk_texts)} chunks for {doc_id}; saved {n_tbl} tables, {n_img} images"
-            )
-        except Exception as e:
-            logger.error(f"Vector upsert failed for {doc_id}: {e}")
+        logger.info(
+            f"Prepared {len(chunk_texts)} chunks for {doc_id}; found {n_tbl} tables, {n_img} images"
+        )
     else:
         logger.warning(f"No chunks to index for {doc_id}")
+    return chunk_ids, chunk_texts, chunk_metas, assets
+
+
+_Batch = Tuple[List[str], List[str], List[dict]]
+
+
+def _take_batches(
+    ids: List[str],
+    docs: List[str],
+    metas: List[dict],
+    batch_size: int,
+    final: bool = False,
+) -> Iterator[_Batch]:
+    """Yield ``batch_size`` slices of the buffers, trimming them as it goes.
+
+    Without ``final`` only full batches are taken and the remainder stays
+    buffered for the next document.
+    """
+
+    batch_size = max(1, batch_size)
+    while ids and (final or len(ids) >= batch_size):
+        n = min(batch_size, len(ids))
+        batch = (ids[:n], docs[:n], metas[:n])
+        del ids[:n], docs[:n], metas[:n]
+        yield batch
+
+
+def _flush_upserts(
+    vs: VectorStore,
+    ids: List[str],
+    docs: List[str],
+    metas: List[dict],
+    batch_size: int,
+    final: bool = False,
+) -> None:
+    """Upsert buffered chunks in ``batch_size`` slices, trimming the buffers."""
+
+    for batch_ids, batch_docs, batch_metas in _take_batches(
+        ids, docs, metas, batch_size, final
+    ):
+        n = len(batch_ids)
+        try:
+            vs.upsert(ids=batch_ids, documents=batch_docs, metadatas=batch_metas)
+            logger.info(f"Indexed batch of {n} chunks")
+        except Exception as e:
+            logger.error(f"Vector upsert failed for batch of {n} chunks: {e}")
+
+
+async def _queued_batches(
+    chunked: queue.Queue, batch_size: int
+) -> AsyncIterator[_Batch]:
+    """Drain ``chunked`` without blocking the event loop, yielding full batches."""
+
+    ids: List[str] = []
+    docs: List[str] = []
+    metas: List[dict] = []
+    while True:
+        item = await asyncio.to_thread(chunked.get)
+        if item is _STOP:
+            break
+        doc_ids, doc_texts, doc_metas = item
+        ids.extend(doc_ids)
+        docs.extend(doc_texts)
+        metas.extend(doc_metas)
+        for batch in _take_batches(ids, docs, metas, batch_size):
+            yield batch
+    for batch in _take_batches(ids, docs, metas, batch_size, final=True):
+        yield batch
+
+
+async def _upsert_stage_async(chunked: queue.Queue, collection: str) -> bool:
+    """Stream batches to the Chroma server with several writes in flight.
+
+    Returns False, leaving the queue untouched, if the server is unreachable.
+    """
+
+    try:
+        avs = await AsyncVectorStore.connect(collection)
+    except Exception as e:
+        logger.error(f"Async Chroma client unavailable, upserting synchronously: {e}")
+        return False
+    await avs.upsert_batches(_queued_batches(chunked, EMBED_BATCH_SIZE))
+    return True
+
+
+def _upsert_stage(chunked: queue.Queue, vs: VectorStore) -> None:
+    """Buffer chunks across documents and upsert them in batches.
+
+    Against a Chroma server the batches go through the async client so
+    several writes are pipelined.
+    """
+
+    if (
+        isinstance(vs, VectorStore)
+        and vs.transport == "http"
+        and asyncio.run(_upsert_stage_async(chunked, vs.collection))
+    ):
+        return
+    ids: List[str] = []
+    docs: List[str] = []
+    metas: List[dict] = []
+    for doc_ids, doc_texts, doc_metas in iter(chunked.get, _STOP):
+        ids.extend(doc_ids)
+        docs.extend(doc_texts)
+        metas.extend(doc_metas)
+        _flush_upserts(vs, ids, docs, metas, EMBED_BATCH_SIZE)
+    _flush_upserts(vs, ids, docs, metas, EMBED_BATCH_SIZE, final=True)
+
+
+def _init_parse_worker(n_threads: int) -> None:
+    """Cap a parse worker's PyTorch/OpenMP threads so workers share the cores."""
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(n_threads)
+    try:
+        import torch
+
+        torch.set_num_threads(n_threads)
+    except Exception:  # pragma: no cover - optional dependency
+        pass
+
+
+def _run_upsert_stage(
+    chunked: queue.Queue, vs: VectorStore, errors: List[BaseException]
+) -> None:
+    """Run ``_upsert_stage``, recording a fatal error for the main thread."""
+
+    try:
+        _upsert_stage(chunked, vs)
+    except BaseException as e:
+        logger.exception(f"Upsert stage failed: {e}")
+        errors.append(e)
+
+
+def _put_while_alive(q: queue.Queue, item, consumer: threading.Thread) -> bool:
+    """Put ``item`` on the bounded ``q``; return False if ``consumer`` has died."""
+
+    while True:
+        try:
+            q.put(item, timeout=1.0)
+            return True
+        except queue.Full:
+            if not consumer.is_alive():
+                return False
+
+
+def _submit_parse(
+    pool: ProcessPoolExecutor,
+    futures: Dict[Future, Tuple[Path, dict]],
+    path: Path,
+    meta_map: Dict[str, dict],
+) -> None:
+    """Queue one PDF for parsing in the worker pool."""
+
+    doc_id = guess_doc_id(path)
+    logger.info(f"Processing {path.name} as doc_id={doc_id}")
+    meta = meta_map.get(doc_id, {})
+    futures[pool.submit(process_pdf_parse, path, meta)] = (path, meta)
+
+
+def _collect_parse(
+    future: Future,
+    path: Path,
+    meta: dict,
+    store: AssetStore,
+    chunked: queue.Queue,
+    upserter: threading.Thread,
+) -> bool:
+    """Persist a parsed document and hand its chunks to the upsert stage.
+
+    Returns False if the upsert stage has died and can take no more chunks.
+    """
+
+    doc_id = guess_doc_id(path)
+    try:
+        ids, docs, metas, assets = future.result()
+        persist_document(store, path, meta, assets)
+    except PartitionError as e:
+        logger.error(f"partition_pdf failed for {path}: {e}")
+        store.record_failure(doc_id, path, f"partition_pdf error: {e}")
+        return True
+    except Exception as e:
+        logger.exception(f"Unexpected failure for {path}: {e}")
+        store.record_failure(doc_id, path, f"unexpected: {e}")
+        return True
+    return _put_while_alive(chunked, (ids, docs, metas), upserter)
 
 
 def main():
-    """Run ingestion over all discovered PDFs."""
+    """Run ingestion over all discovered PDFs.
+
+    PDFs are parsed and chunked in a process pool, with at most
+    2 * workers documents in flight. The main process owns the asset store
+    and persists results as they complete, while an upsert thread drains a
+    bounded queue so embedding overlaps with parsing.
+    """
 
     meta_map = load_metadata(METADATA_JSONL)
     paths = walk_pdfs(DATA_DIRS)
-    vs = VectorStore()
-    store = AssetStore()
     logger.info(f"Found {len(paths)} PDFs to process")
-    for p in paths:
+    workers = max(1, INGEST_WORKERS)
+    threads = INGEST_WORKER_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    # Spawned workers do not inherit the model's OpenMP/CUDA state or the
+    # upsert thread, which forked children can deadlock on.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_parse_worker,
+        initargs=(threads,),
+    ) as pool:
+        vs = open_vector_store()
+        vs.warmup()
+        store = AssetStore()
+        chunked: queue.Queue = queue.Queue(maxsize=max(1, INGEST_QUEUE_SIZE))
+        upsert_errors: List[BaseException] = []
+        upserter = threading.Thread(
+            target=_run_upsert_stage,
+            args=(chunked, vs, upsert_errors),
+            name="ingest-upsert",
+        )
+        upserter.start()
         try:
-            process_pdf(p, meta_map, vs, store)
-        except Exception as e:
-            doc_id = guess_doc_id(p)
-            logger.exception(f"Unexpected failure for {p}: {e}")
-            store.record_failure(doc_id, p, f"unexpected: {e}")
+            remaining = iter(paths)
+            futures: Dict[Future, Tuple[Path, dict]] = {}
+            for p in islice(remaining, 2 * workers):
+                _submit_parse(pool, futures, p, meta_map)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    p, meta = futures.pop(future)
+                    if not _collect_parse(future, p, meta, store, chunked, upserter):
+                        for pending in futures:
+                            pending.cancel()
+                        raise RuntimeError("Upsert stage stopped") from (
+                            upsert_errors[0] if upsert_errors else None
+                        )
+                    for p in islice(remaining, 1):
+                        _submit_parse(pool, futures, p, meta_map)
+        finally:
+            _put_while_alive(chunked, _STOP, upserter)
+            upserter.join()
+            store.close()
+        if upsert_errors:
+            raise upsert_errors[0]
 
 
 if __name__ == "__main__":
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, List, Optional
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 from .config import TOP_K
-from .vectorstore import VectorStore
+from .vectorstore import VectorStore, open_vector_store
+
+_TOKEN_RE = re.compile(r"\W+")
 
 
 def retrieve(
@@ -15,7 +20,7 @@ def retrieve(
 ):
     """Fetch top-k candidates from the vector store and normalize the result."""
 
-    vector_store = vs or VectorStore()
+    vector_store = vs or open_vector_store()
     res = vector_store.query(query_text=query, top_k=top_k, where=where)
     out = []
     ids = res.get("ids", [[]])[0]
@@ -34,23 +39,33 @@ def retrieve(
     return out
 
 
-def _tokenize(text: str) -> List[str]:
+@lru_cache(maxsize=4096)
+def _tokenize(text: str) -> Tuple[str, ...]:
     """Tokenize text using a lightweight regex split."""
 
-    return [token for token in re.split(r"\W+", (text or "").lower()) if token]
+    return tuple(token for token in _TOKEN_RE.split((text or "").lower()) if token)
+
+
+@lru_cache(maxsize=4096)
+def _token_hashes(text: str) -> np.ndarray:
+    """Return the sorted, de-duplicated token hashes of a text (read-only)."""
+
+    hashes = np.unique(np.fromiter(map(hash, _tokenize(text)), dtype=np.int64))
+    hashes.flags.writeable = False
+    return hashes
 
 
 def rerank_results(query: str, results: List[dict], alpha: float = 0.7) -> List[dict]:
     """Combine vector similarity with token overlap for simple re-ranking."""
 
-    q_tokens = set(_tokenize(query))
+    q_hashes = _token_hashes(query or "")
     ranked = []
     for result in results:
         distance = result.get("distance")
         vec_sim = 1.0 - float(distance) if distance is not None else 0.0
-        t_tokens = set(_tokenize(result.get("text", "")))
-        inter = len(q_tokens & t_tokens)
-        union = len(q_tokens | t_tokens) or 1
+        t_hashes = _token_hashes(result.get("text", "") or "")
+        inter = np.intersect1d(q_hashes, t_hashes, assume_unique=True).size
+        union = (q_hashes.size + t_hashes.size - inter) or 1
         jaccard = inter / union
         score = alpha * vec_sim + (1 - alpha) * jaccard
         enriched = dict(result)
@@ -60,15 +75,47 @@ def rerank_results(query: str, results: List[dict], alpha: float = 0.7) -> List[
     return ranked
 
 
+def metadata_flag(field: str, value: str) -> str:
+    """Return the boolean metadata key marking ``value`` in a list-valued field.
+
+    Chroma cannot test membership in list metadata, so ingestion stores one
+    ``True`` flag per lowercased value and queries filter on those keys.
+    Matching is therefore exact per value, ignoring case and surrounding
+    whitespace: ``"energy"`` matches ``"Energy"`` but not ``"Renewable Energy"``.
+    """
+
+    return f"{field}_lc:{value.strip().lower()}"
+
+
+def _any_flag(field: str, values: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """Build a clause matching chunks flagged with any of ``values``."""
+
+    flags = [
+        {metadata_flag(field, value): True} for value in values or [] if value.strip()
+    ]
+    if not flags:
+        return None
+    return flags[0] if len(flags) == 1 else {"$or": flags}
+
+
 def build_where_filters(
     industries: Optional[List[str]] = None,
     countries: Optional[List[str]] = None,
     date_from: Optional[int] = None,
     date_to: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
-    """Construct Chroma-compatible range filters for metadata queries."""
+    """Construct Chroma-compatible metadata filters for industries, countries and dates.
+
+    Industries and countries match any listed value exactly (see
+    ``metadata_flag``); collections without the flags match nothing, which
+    ``has_metadata_flags`` detects.
+    """
 
     clauses: List[Dict[str, Any]] = []
+    for field, values in (("industries", industries), ("country_codes", countries)):
+        clause = _any_flag(field, values)
+        if clause:
+            clauses.append(clause)
     if date_from is not None or date_to is not None:
         range_clause: Dict[str, Any] = {}
         if date_from is not None:
@@ -82,39 +129,17 @@ def build_where_filters(
     return {"$and": clauses} if len(clauses) > 1 else clauses[0]
 
 
-def _value_matches(meta_val, targets: List[str]) -> bool:
-    """Check whether metadata contains any of the target values."""
+def has_metadata_flags(vs: VectorStore, sample: int = 100) -> bool:
+    """Return False if sampled chunks carry list metadata but no filter flags.
 
-    if not meta_val:
-        return False
-    if isinstance(meta_val, (list, tuple, set)):
-        haystack = [str(v).lower() for v in meta_val]
-        return any(target in haystack for target in targets)
-    text = str(meta_val).lower()
-    return any(target in text for target in targets)
+    Such collections were ingested before ``metadata_flag`` keys existed and
+    must be re-ingested for industry and country filters to match.
+    """
 
-
-def filter_results_by_metadata(
-    results: List[dict],
-    industries: Optional[List[str]] = None,
-    countries: Optional[List[str]] = None,
-) -> List[dict]:
-    """Apply in-memory filtering for industries and country codes."""
-
-    if not industries and not countries:
-        return results
-    norm_inds = [value.strip().lower() for value in (industries or []) if value.strip()]
-    norm_countries = [
-        value.strip().lower() for value in (countries or []) if value.strip()
-    ]
-    filtered: List[dict] = []
-    for result in results:
-        meta = result.get("metadata") or {}
-        if norm_inds and not _value_matches(meta.get("industries"), norm_inds):
-            continue
-        if norm_countries and not _value_matches(
-            meta.get("country_codes"), norm_countries
-        ):
-            continue
-        filtered.append(result)
-    return filtered
+    for meta in vs.sample_metadatas(sample):
+        for field in ("industries", "country_codes"):
+            if meta.get(field) and not any(
+                key.startswith(f"{field}_lc:") for key in meta
+            ):
+                return False
+    return True
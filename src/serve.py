@@ -1,27 +1,68 @@
 from __future__ import annotations
 
+import asyncio
 import html
+import threading
+from contextlib import asynccontextmanager
+from string import Template
 from typing import List, Optional
 
 from google import genai
 from fastapi import FastAPI, Form, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 
-from .config import GEMINI_API_KEY, GEMINI_GENERATE_MODEL, MAX_ASSET_ATTACH
+from .config import (
+    GEMINI_API_KEY,
+    GEMINI_GENERATE_MODEL,
+    MAX_ASSET_ATTACH,
+    MAX_CONCURRENT_UPLOADS,
+)
 from .datastore import AssetStore
 from .logging_utils import get_logger
 from .search import (
     build_where_filters,
-    filter_results_by_metadata,
+    has_metadata_flags,
     rerank_results,
     retrieve,
 )
+from .vectorstore import VectorStore, open_vector_store
+
+try:
+    from markupsafe import escape as _escape
+except Exception:  # pragma: no cover - optional dependency
+    _escape = html.escape  # type: ignore
 
 logger = get_logger(__name__)
 
-app = FastAPI(title="Domain QA")
+
+_MISSING_FLAGS_MSG = (
+    "The vector collection was ingested without industry/country filter flags;"
+    " re-run ingestion to enable these filters."
+)
+_missing_filter_flags = False
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    """Open the vector store and warm the model before serving requests."""
+
+    global _missing_filter_flags
+    try:
+        store = await asyncio.to_thread(_get_vector_store)
+        await asyncio.to_thread(store.warmup)
+        _missing_filter_flags = not await asyncio.to_thread(has_metadata_flags, store)
+    except Exception as exc:
+        logger.warning(f"Vector store warmup failed: {exc}")
+    if _missing_filter_flags:
+        logger.error(_MISSING_FLAGS_MSG)
+    yield
+
+
+app = FastAPI(title="Domain QA", lifespan=_lifespan)
 
 _client: Optional[genai.Client] = None
+_vector_store: Optional[VectorStore] = None
+_vector_store_lock = threading.Lock()
 
 
 def _get_client() -> Optional[genai.Client]:
@@ -39,63 +80,91 @@ def _get_client() -> Optional[genai.Client]:
     return _client
 
 
-def render_home(
-    results=None,
-    answer: str = "",
-    query: str = "",
-    industries: str = "",
-    countries: str = "",
-    date_from: str = "",
-    date_to: str = "",
-) -> str:
-    """Render the simple HTML interface for interactive queries."""
+def _get_vector_store() -> VectorStore:
+    """Return the shared vector store, so its query cache outlives a request."""
 
-    rows = ""
-    if results:
-        for r in results:
-            m = r["metadata"] or {}
-            rows += f"<li><code>{html.escape(r['id'])}</code> [p={html.escape(str(m.get('page')))}] — {html.escape(r['text'][:240])}...</li>"
-    body = f"""
+    global _vector_store
+    with _vector_store_lock:
+        if _vector_store is None:
+            _vector_store = open_vector_store()
+        return _vector_store
+
+
+_HOME_TEMPLATE = Template(
+    """
     <html><head><title>Domain QA</title>
     <style>
-      body {{ font-family: system-ui, sans-serif; margin: 2rem; }}
-      textarea {{ width: 100%; height: 100px; }}
-      pre {{ background: #f7f7f7; padding: 1rem; white-space: pre-wrap; }}
-      .row {{ display: flex; gap: 1rem; align-items: end; }}
-      .row > div {{ flex: 1; }}
+      body { font-family: system-ui, sans-serif; margin: 2rem; }
+      textarea { width: 100%; height: 100px; }
+      pre { background: #f7f7f7; padding: 1rem; white-space: pre-wrap; }
+      .row { display: flex; gap: 1rem; align-items: end; }
+      .row > div { flex: 1; }
     </style></head>
     <body>
       <h2>Knowledge Base QA</h2>
       <form method='post' action='/ask'>
-        <textarea name='q' placeholder='Ask a question...'>{html.escape(query)}</textarea>
+        <textarea name='q' placeholder='Ask a question...'>$query</textarea>
         <br/>
         <div class='row'>
           <div>
             <label>Industries (comma separated)</label><br/>
-            <input type='text' name='industries' style='width:100%' value='{html.escape(industries)}' />
+            <input type='text' name='industries' style='width:100%' value='$industries' />
           </div>
           <div>
             <label>Country codes (comma separated)</label><br/>
-            <input type='text' name='countries' style='width:100%' value='{html.escape(countries)}' />
+            <input type='text' name='countries' style='width:100%' value='$countries' />
           </div>
         </div>
         <div class='row'>
           <div>
             <label>Date from (timestamp)</label><br/>
-            <input type='text' name='date_from' style='width:100%' value='{html.escape(date_from)}' />
+            <input type='text' name='date_from' style='width:100%' value='$date_from' />
           </div>
           <div>
             <label>Date to (timestamp)</label><br/>
-            <input type='text' name='date_to' style='width:100%' value='{html.escape(date_to)}' />
+            <input type='text' name='date_to' style='width:100%' value='$date_to' />
           </div>
         </div>
         <button type='submit'>Ask</button>
       </form>
-      {f"<h3>Answer</h3><pre>{html.escape(answer)}</pre>" if answer else ""}
-      {"<h3>Top Context</h3><ol>" + rows + "</ol>" if results else ""}
+      $answer_section
+      $results_section
     </body></html>
     """
-    return body
+)
+
+
+def render_home(
+    results=None,
+    answer: str = "",
+    query: str = "",
+    industries: str = "",
+    countries: str = "",
+    date_from: str = "",
+    date_to: str = "",
+) -> str:
+    """Render the simple HTML interface for interactive queries."""
+
+    results_section = ""
+    if results:
+        rows = []
+        for r in results:
+            m = r["metadata"] or {}
+            rows.append(
+                f"<li><code>{_escape(r['id'])}</code> [p={_escape(str(m.get('page')))}] — {_escape(r['text'][:240])}...</li>"
+            )
+        results_section = "<h3>Top Context</h3><ol>" + "".join(rows) + "</ol>"
+    return _HOME_TEMPLATE.substitute(
+        query=_escape(query),
+        industries=_escape(industries),
+        countries=_escape(countries),
+        date_from=_escape(date_from),
+        date_to=_escape(date_to),
+        answer_section=(
+            f"<h3>Answer</h3><pre>{_escape(answer)}</pre>" if answer else ""
+        ),
+        results_section=results_section,
+    )
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -120,12 +189,37 @@ def build_prompt(contexts: List[dict], query: str) -> str:
     return f"{header}Context:\n{ctx_block}\n\nQuestion: {query}\nAnswer:"
 
 
-def attach_media_parts(
+async def _upload_image(
+    client: genai.Client, asset, doc_id: str, semaphore: asyncio.Semaphore
+) -> Optional[dict]:
+    """Upload one image asset off the event loop and return its prompt part."""
+
+    async with semaphore:
+        try:
+            upload = await asyncio.to_thread(client.files.upload, file=asset.file_path)
+        except Exception as e:
+            logger.warning(f"Failed to upload asset {asset.asset_id}: {e}")
+            return None
+    logger.info("Attached image asset %s for doc %s", asset.asset_id, doc_id)
+    return {
+        "file_data": {
+            "file_uri": upload.uri,
+            "mime_type": getattr(upload, "mime_type", None),
+        }
+    }
+
+
+async def attach_media_parts(
     client: genai.Client, contexts: List[dict], max_assets: int, store: AssetStore
 ):
-    """Collect image and table assets to augment the Gemini prompt."""
+    """Collect image and table assets to augment the Gemini prompt.
 
-    parts = []
+    Image uploads run concurrently, at most ``MAX_CONCURRENT_UPLOADS`` at a
+    time, and the returned parts keep the order of the contexts.
+    """
+
+    # Entries are ready table parts or (asset, doc_id) image uploads.
+    planned = []
     added = 0
     seen_docs = set()
     seen_tables = set()
@@ -151,34 +245,32 @@ def attach_media_parts(
                         "Attached table asset %s for doc %s", a.asset_id, doc_id
                     )
                     snippet = table_text[:1500]
-                    parts.append({"text": f"[Table {a.asset_id}] {snippet}"})
+                    planned.append({"text": f"[Table {a.asset_id}] {snippet}"})
                     seen_tables.add(a.asset_id)
                     added += 1
                 continue
-            try:
-                if added >= max_assets:
-                    break
-                upload = client.files.upload(file=a.file_path)
-                logger.info("Attached image asset %s for doc %s", a.asset_id, doc_id)
-                parts.append(
-                    {
-                        "file_data": {
-                            "file_uri": upload.uri,
-                            "mime_type": getattr(upload, "mime_type", None),
-                        }
-                    }
-                )
-                added += 1
-                if added >= max_assets:
-                    break
-            except Exception as e:
-                logger.warning(f"Failed to upload asset {a.asset_id}: {e}")
+            if added >= max_assets:
+                break
+            planned.append((a, doc_id))
+            added += 1
+            if added >= max_assets:
+                break
         if added >= max_assets:
             break
-    return parts
+
+    semaphore = asyncio.Semaphore(max(1, MAX_CONCURRENT_UPLOADS))
+    uploads = [
+        (i, _upload_image(client, entry[0], entry[1], semaphore))
+        for i, entry in enumerate(planned)
+        if isinstance(entry, tuple)
+    ]
+    results = await asyncio.gather(*(coro for _, coro in uploads))
+    for (i, _), part in zip(uploads, results):
+        planned[i] = part
+    return [part for part in planned if part is not None]
 
 
-def generate_answer(contexts: List[dict], query: str) -> str:
+async def generate_answer(contexts: List[dict], query: str) -> str:
     """Build a grounded prompt and ask Gemini for an answer."""
 
     client = _get_client()
@@ -190,7 +282,9 @@ def generate_answer(contexts: List[dict], query: str) -> str:
     message_parts = [{"text": prompt}]
     store = AssetStore()
     try:
-        media_parts = attach_media_parts(client, contexts, MAX_ASSET_ATTACH, store)
+        media_parts = await attach_media_parts(
+            client, contexts, MAX_ASSET_ATTACH, store
+        )
         message_parts.extend(media_parts)
     except Exception as exc:
         logger.warning(f"Failed to attach media parts: {exc}")
@@ -207,7 +301,8 @@ def generate_answer(contexts: List[dict], query: str) -> str:
         }
     ]
     try:
-        resp = client.models.generate_content(
+        resp = await asyncio.to_thread(
+            client.models.generate_content,
             model=GEMINI_GENERATE_MODEL,
             contents=contents,
         )
@@ -218,6 +313,16 @@ def generate_answer(contexts: List[dict], query: str) -> str:
         return f"(Gemini generation failed)\n\n{top_context}".strip()
 
 
+def _search(q: str, where: Optional[dict]) -> List[dict]:
+    """Retrieve and rerank contexts for ``q``.
+
+    Embeds the query and searches the store, so handlers run it in a worker
+    thread rather than on the event loop.
+    """
+
+    return rerank_results(q, retrieve(q, vs=_get_vector_store(), where=where))
+
+
 @app.post("/ask", response_class=HTMLResponse)
 async def ask_form(
     q: str = Form(...),
@@ -232,11 +337,21 @@ async def ask_form(
     ccs = [s.strip() for s in countries.split(",") if s.strip()]
     df = int(date_from) if date_from.strip().isdigit() else None
     dt = int(date_to) if date_to.strip().isdigit() else None
+    if _missing_filter_flags and (inds or ccs):
+        return HTMLResponse(
+            render_home(
+                answer=_MISSING_FLAGS_MSG,
+                query=q,
+                industries=industries,
+                countries=countries,
+                date_from=date_from,
+                date_to=date_to,
+            ),
+            status_code=409,
+        )
     where = build_where_filters(inds or None, ccs or None, df, dt)
-    results = retrieve(q, where=where)
-    results = filter_results_by_metadata(results, industries=inds, countries=ccs)
-    results = rerank_results(q, results)
-    answer = generate_answer(results, q)
+    results = await asyncio.to_thread(_search, q, where)
+    answer = await generate_answer(results, q)
     return HTMLResponse(
         render_home(
             results=results,
@@ -270,9 +385,9 @@ async def ask_api(req: Request):
         dt = int(dt) if dt is not None else None
     except Exception:
         dt = None
+    if _missing_filter_flags and (inds or ccs):
+        return JSONResponse({"error": _MISSING_FLAGS_MSG}, status_code=409)
     where = build_where_filters(inds or None, ccs or None, df, dt)
-    results = retrieve(q, where=where)
-    results = filter_results_by_metadata(results, industries=inds, countries=ccs)
-    results = rerank_results(q, results)
-    answer = generate_answer(results, q)
+    results = await asyncio.to_thread(_search, q, where)
+    answer = await generate_answer(results, q)
     return {"answer": answer, "contexts": results}
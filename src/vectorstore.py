@@ -1,82 +1,1387 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+import asyncio
+import atexit
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import AsyncIterable, Callable, Dict, List, Optional, Tuple
 
 import chromadb
+import numpy as np
 from chromadb.api.types import Documents, EmbeddingFunction, Embeddings, IDs, Metadatas
 from sentence_transformers import SentenceTransformer
 
-from .config import CHROMA_DIR, SENTENCE_TRANSFORMER_DEVICE, SENTENCE_TRANSFORMER_MODEL
+from .config import (
+    CHROMA_DIR,
+    CHROMA_HOST,
+    CHROMA_PORT,
+    CHROMA_TRANSPORT,
+    EMBED_BATCH_WINDOW_MS,
+    EMBED_CACHE,
+    EMBED_CACHE_INT8,
+    EMBED_CACHE_MEMORY_SIZE,
+    EMBED_CACHE_PATH,
+    EMBED_MULTI_GPU_MIN_TEXTS,
+    FAISS_DIR,
+    QUERY_CACHE_SIMILARITY,
+    QUERY_CACHE_SIZE,
+    SENTENCE_TRANSFORMER_BACKEND,
+    SENTENCE_TRANSFORMER_BATCH_SIZE,
+    SENTENCE_TRANSFORMER_COMPILE,
+    SENTENCE_TRANSFORMER_DEVICE,
+    SENTENCE_TRANSFORMER_HALF,
+    SENTENCE_TRANSFORMER_MODEL,
+    SENTENCE_TRANSFORMER_QUANTIZE,
+    SENTENCE_TRANSFORMER_THREADS,
+    VECTOR_BACKEND,
+)
 from .logging_utils import get_logger
 
+try:
+    from numba import njit, prange  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    njit = None
+    prange = range
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    faiss = None
+
 logger = get_logger(__name__)
 
 
+def _quantize_rowwise_np(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized implementation of ``quantize_rowwise``."""
+
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _quantize_rowwise_loop(vectors, codes, scales):
+    """Fill ``codes`` and ``scales`` in one pass per row, written for numba."""
+
+    for i in prange(vectors.shape[0]):
+        peak = 0.0
+        for j in range(vectors.shape[1]):
+            a = abs(vectors[i, j])
+            if a > peak:
+                peak = a
+        scale = peak / 127.0 if peak > 0.0 else 1.0
+        scales[i] = scale
+        for j in range(vectors.shape[1]):
+            codes[i, j] = np.int8(np.rint(vectors[i, j] / scale))
+
+
+_quantize_rowwise_jit = (
+    njit(parallel=True, fastmath=True, cache=True)(_quantize_rowwise_loop)
+    if njit is not None
+    else None
+)
+
+
+def quantize_rowwise(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetrically quantize each row to int8; return ``(codes, scales)``.
+
+    A single 1-D vector is treated as one row; its codes keep the input
+    shape and ``scales`` holds one element.
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim > 2:
+        raise ValueError(
+            f"quantize_rowwise expects 1-D or 2-D input, got shape {vectors.shape}"
+        )
+    shape = vectors.shape
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors))
+    if _quantize_rowwise_jit is None:
+        codes, scales = _quantize_rowwise_np(vectors)
+    else:
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        scales = np.empty(vectors.shape[0], dtype=np.float32)
+        _quantize_rowwise_jit(vectors, codes, scales)
+    return codes.reshape(shape), scales
+
+
+def dequantize_rowwise(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """Invert ``quantize_rowwise`` back to float32 rows."""
+
+    return (codes.astype(np.float32) * scales[:, None]).reshape(codes.shape)
+
+
+class EmbeddingCache:
+    """Content-addressed SQLite store of embeddings keyed by model and text.
+
+    With ``int8`` the vectors are kept row-wise quantized (a float32 scale
+    followed by int8 codes), a quarter of the float32 footprint. The last
+    ``memory_size`` vectors read or written are also kept in an in-process
+    LRU, so a text that is embedded again soon after (e.g. a chunk upserted
+    then queried) skips both the model and SQLite.
+    """
+
+    _SELECT_CHUNK = 500
+
+    def __init__(
+        self,
+        path: Path,
+        model_name: str,
+        int8: bool = False,
+        memory_size: int = EMBED_CACHE_MEMORY_SIZE,
+    ):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._prefix = model_name.encode("utf-8") + b"\0"
+        self.int8 = int8
+        self._table = "embeddings_int8" if int8 else "embeddings"
+        self._memory: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._memory_size = memory_size
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._table}"
+            " (key BLOB PRIMARY KEY, vec BLOB NOT NULL) WITHOUT ROWID"
+        )
+        self.conn.commit()
+
+    def key(self, text: str) -> bytes:
+        """Return the cache key for a text under this cache's model."""
+
+        data = self._prefix + text.encode("utf-8", "surrogatepass")
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the cached vectors for whichever ``keys`` are present.
+
+        Keys missing from the in-memory tier are looked up in SQLite and
+        decoded together into one float32 matrix.
+        """
+
+        hits: Dict[bytes, np.ndarray] = {}
+        found: List[bytes] = []
+        blobs: List[bytes] = []
+        with self._lock:
+            pending = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is None:
+                    pending.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    hits[key] = vector
+            for i in range(0, len(pending), self._SELECT_CHUNK):
+                chunk = pending[i : i + self._SELECT_CHUNK]
+                rows = self.conn.execute(
+                    f"SELECT key, vec FROM {self._table} WHERE key IN"
+                    f" ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, vec in rows:
+                    found.append(key)
+                    blobs.append(vec)
+        if blobs:
+            loaded = dict(zip(found, self._decode_many(blobs)))
+            self._remember(loaded)
+            hits.update(loaded)
+        return hits
+
+    def _remember(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        """Add vectors to the in-memory tier, evicting the least recently used."""
+
+        if self._memory_size <= 0:
+            return
+        with self._lock:
+            for key, vector in vectors.items():
+                # Copy so a cached row does not pin its whole batch.
+                self._memory[key] = vector.copy()
+                self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
+
+    def _decode_many(self, blobs: List[bytes]) -> np.ndarray:
+        """Turn equally sized stored blobs back into a float32 matrix."""
+
+        buf = b"".join(blobs)
+        if not self.int8:
+            return np.frombuffer(buf, dtype=np.float32).reshape(len(blobs), -1)
+        rows = np.frombuffer(buf, dtype=np.uint8).reshape(len(blobs), -1)
+        scales = rows[:, :4].copy().view(np.float32).ravel()
+        return dequantize_rowwise(rows[:, 4:].view(np.int8), scales)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, List[bytes]]:
+        """Return ``vectors`` as a later lookup would see them, and their blobs.
+
+        Quantization happens here only, so callers can hand out the stored
+        form before (or without) writing it.
+        """
+
+        if self.int8:
+            codes, scales = quantize_rowwise(vectors)
+            blobs = [s.tobytes() + c.tobytes() for c, s in zip(codes, scales)]
+            return dequantize_rowwise(codes, scales), blobs
+        stored = np.asarray(vectors, dtype=np.float32)
+        return stored, [v.tobytes() for v in stored]
+
+    def put_many(
+        self, keys: List[bytes], stored: np.ndarray, blobs: List[bytes]
+    ) -> None:
+        """Store the output of ``encode``, one row per key, in one transaction."""
+
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self._table}(key, vec) VALUES (?, ?)",
+                list(zip(keys, blobs)),
+            )
+            self.conn.commit()
+        self._remember(dict(zip(keys, stored)))
+
+    def close(self) -> None:
+        """Close the underlying SQLite connection."""
+
+        with self._lock:
+            self.conn.close()
+
+
+class BatchedEncoder:
+    """Coalesce concurrent encode requests into shared model batches.
+
+    A daemon thread takes the first pending request, gathers whatever else
+    arrives within ``window_s`` (up to ``max_texts`` texts) and encodes it
+    all with one call, handing each caller its slice of the result.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str]], np.ndarray],
+        window_s: float,
+        max_texts: int = 256,
+    ):
+        self._encode = encode
+        self._window_s = window_s
+        self._max_texts = max_texts
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="embed-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode ``texts`` as part of the next shared batch."""
+
+        future: Future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self) -> None:
+        """Collect requests into batches and encode them until the process exits."""
+
+        while True:
+            batch = [self._queue.get()]
+            n_texts = len(batch[0][0])
+            deadline = time.monotonic() + self._window_s
+            while n_texts < self._max_texts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_texts += len(item[0])
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = self._encode(texts)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start : start + len(item_texts)])
+                start += len(item_texts)
+
+
 class SentenceTransformerEmbeddingFunction(EmbeddingFunction[str]):
-    """Embedding function that delegates to a sentence-transformer model."""
+    """Embedding function that delegates to a sentence-transformer model.
+
+    The model is loaded on the first call, so processes that never embed
+    anything do not pay for it.
+    """
 
     def __init__(
         self,
         model_name: str = SENTENCE_TRANSFORMER_MODEL,
         device: Optional[str] = SENTENCE_TRANSFORMER_DEVICE,
+        backend: str = SENTENCE_TRANSFORMER_BACKEND,
     ):
         self.model_name = model_name
         self.device = device
+        self.backend = backend
+        self.model: Optional[SentenceTransformer] = None
+        self.quantized = False
+        self.half_dtype: Optional[str] = None
+        self._cache: Optional[EmbeddingCache] = None
+        self._ready = False
+        self._load_lock = threading.Lock()
+        self._pool: Optional[dict] = None
+        self._pool_checked = False
+        self._batcher: Optional[BatchedEncoder] = None
+        if EMBED_BATCH_WINDOW_MS > 0:
+            self._batcher = BatchedEncoder(
+                self.batch_encode,
+                EMBED_BATCH_WINDOW_MS / 1000.0,
+                max_texts=4 * max(1, SENTENCE_TRANSFORMER_BATCH_SIZE),
+            )
+
+    def _ensure_model(self) -> None:
+        """Load the model and embedding cache on first use, once per instance."""
+
+        if self._ready:
+            return
+        with self._load_lock:
+            if not self._ready:
+                self._load()
+                self._ready = True
+
+    def _load(self) -> None:
+        """Load and optimize the model, then open its embedding cache."""
+
         logger.info(
-            "Loading sentence-transformer model '%s' (device=%s)",
-            model_name,
-            device or "auto",
+            "Loading sentence-transformer model '%s' (device=%s, backend=%s)",
+            self.model_name,
+            self.device or "auto",
+            self.backend,
+        )
+        self.model, self.backend = self._load_model(
+            self.model_name, self.device, self.backend
         )
-        self.model = SentenceTransformer(model_name, device=device, cache_folder=None)
+        if SENTENCE_TRANSFORMER_THREADS > 0 and self.backend == "torch":
+            self._pin_threads(SENTENCE_TRANSFORMER_THREADS)
+        if SENTENCE_TRANSFORMER_QUANTIZE and self.backend == "torch":
+            self._quantize_model()
+        if SENTENCE_TRANSFORMER_HALF and self.backend == "torch":
+            self._half_model()
+        if SENTENCE_TRANSFORMER_COMPILE and self.backend == "torch":
+            self._compile_model()
         if hasattr(self.model, "get_sentence_embedding_dimension"):
             logger.info(
                 "Loaded %s; embedding dimension=%d",
-                model_name,
+                self.model_name,
                 self.model.get_sentence_embedding_dimension(),
             )
+        if EMBED_CACHE:
+            try:
+                variant = [] if self.backend == "torch" else [self.backend]
+                if self.quantized:
+                    variant.append("int8")
+                if self.half_dtype:
+                    variant.append(self.half_dtype)
+                cache_id = "@".join([self.model_name, *variant])
+                self._cache = EmbeddingCache(
+                    EMBED_CACHE_PATH, cache_id, int8=EMBED_CACHE_INT8
+                )
+            except Exception as exc:
+                logger.warning(f"Embedding cache unavailable: {exc}")
 
-    def __call__(self, input: Documents) -> Embeddings:
-        """Encode documents into normalized embedding vectors."""
+    @staticmethod
+    def _load_model(
+        model_name: str, device: Optional[str], backend: str
+    ) -> Tuple[SentenceTransformer, str]:
+        """Load the model on ``backend``, falling back to PyTorch on failure.
+
+        The ``onnx`` and ``openvino`` backends need the matching ``optimum``
+        extras; models without exported weights are exported on first load.
+        """
+
+        if backend != "torch":
+            try:
+                model = SentenceTransformer(
+                    model_name, device=device, cache_folder=None, backend=backend
+                )
+                return model, backend
+            except Exception as exc:
+                logger.warning(
+                    f"Failed to load {model_name} with backend={backend}; "
+                    f"using torch: {exc}"
+                )
+        return SentenceTransformer(
+            model_name, device=device, cache_folder=None
+        ), "torch"
+
+    def _pin_threads(self, n_threads: int) -> None:
+        """Give CPU inference ``n_threads`` intra-op threads and one inter-op thread.
+
+        Inter-op threads can only be set before PyTorch starts parallel work,
+        so that part is skipped when it is too late.
+        """
+
+        try:
+            import torch
+
+            if self.model.device.type != "cpu":
+                return
+            torch.set_num_threads(n_threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass
+            logger.info("Using %d PyTorch threads for %s", n_threads, self.model_name)
+        except Exception as exc:
+            logger.warning(f"Failed to set PyTorch threads: {exc}")
+
+    def _quantize_model(self) -> None:
+        """Swap the model's ``nn.Linear`` layers for dynamic INT8 ones on CPU.
+
+        Outputs are still float32, but vectors differ slightly from the fp32
+        model, so quantized embeddings use their own cache namespace.
+        """
+
+        try:
+            import torch
+
+            if self.model.device.type != "cpu":
+                logger.info("Skipping INT8 quantization on %s", self.model.device)
+                return
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+            self.quantized = True
+            logger.info("Applied dynamic INT8 quantization to %s", self.model_name)
+        except Exception as exc:
+            logger.warning(
+                f"INT8 quantization unavailable for {self.model_name}: {exc}"
+            )
+
+    def _half_model(self) -> None:
+        """Cast the model to bfloat16 (or float16 without bf16 support) on CUDA.
+
+        Embeddings are still returned as float32, but differ slightly from
+        the fp32 model, so they use their own cache namespace.
+        """
+
+        try:
+            import torch
+
+            if self.model.device.type != "cuda":
+                logger.info("Skipping half precision on %s", self.model.device)
+                return
+            if torch.cuda.is_bf16_supported():
+                dtype, self.half_dtype = torch.bfloat16, "bf16"
+            else:
+                dtype, self.half_dtype = torch.float16, "fp16"
+            self.model = self.model.to(dtype=dtype)
+            logger.info("Running %s in %s", self.model_name, self.half_dtype)
+        except Exception as exc:
+            self.half_dtype = None
+            logger.warning(f"Half precision unavailable for {self.model_name}: {exc}")
+
+    def _compile_model(self) -> None:
+        """Wrap the transformer in ``torch.compile``; the first batches are slow.
+
+        Attention already runs through PyTorch's fused SDPA kernels in current
+        ``transformers``; compiling additionally fuses the surrounding ops.
+        """
+
+        try:
+            import torch
+
+            module = self.model._first_module()
+            module.auto_model = torch.compile(module.auto_model, dynamic=True)
+            logger.info("Compiled %s with torch.compile", self.model_name)
+        except Exception as exc:
+            logger.warning(f"torch.compile unavailable for {self.model_name}: {exc}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Run the model over ``texts`` and return normalized float32 vectors.
+
+        ``encode`` already sorts the texts by length before batching, so each
+        batch is padded only to its own longest text.
+        """
 
-        texts: List[str] = [doc if isinstance(doc, str) else "" for doc in input]
-        if not texts:
-            return []
         logger.debug("Encoding %d document(s) with %s", len(texts), self.model_name)
-        embeddings = self.model.encode(
+        return self.model.encode(
             texts,
+            batch_size=max(1, SENTENCE_TRANSFORMER_BATCH_SIZE),
             convert_to_numpy=True,
             normalize_embeddings=True,
             show_progress_bar=False,
         )
-        return embeddings.tolist()
+
+    def _multi_gpu_pool(self) -> Optional[dict]:
+        """Return a worker pool spanning every visible GPU, started on first use.
+
+        ``None`` when fewer than two GPUs are visible, a single device was
+        requested explicitly, or the model does not run on PyTorch.
+        """
+
+        if self._pool_checked:
+            return self._pool
+        with self._load_lock:
+            if self._pool_checked:
+                return self._pool
+            try:
+                import torch
+
+                if (
+                    self.backend == "torch"
+                    and self.device in (None, "cuda")
+                    and torch.cuda.device_count() > 1
+                ):
+                    self._pool = self.model.start_multi_process_pool()
+                    atexit.register(self.close)
+                    logger.info(
+                        "Started multi-GPU encode pool on %d devices",
+                        torch.cuda.device_count(),
+                    )
+            except Exception as exc:
+                logger.warning(f"Multi-GPU encoding unavailable: {exc}")
+            self._pool_checked = True
+        return self._pool
+
+    def batch_encode(self, texts: List[str]) -> np.ndarray:
+        """Encode ``texts``, sharding large inputs across GPUs when several exist."""
+
+        self._ensure_model()
+        pool = None
+        if 0 < EMBED_MULTI_GPU_MIN_TEXTS <= len(texts):
+            pool = self._multi_gpu_pool()
+        if pool is None:
+            return self._encode(texts)
+        logger.debug("Encoding %d document(s) across GPUs", len(texts))
+        return self.model.encode(
+            texts,
+            pool=pool,
+            batch_size=max(1, SENTENCE_TRANSFORMER_BATCH_SIZE),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+
+    def _run_model(self, texts: List[str]) -> np.ndarray:
+        """Encode directly, or through the micro-batcher when it is enabled."""
+
+        if self._batcher is not None:
+            return self._batcher.encode(texts)
+        return self.batch_encode(texts)
+
+    def close(self) -> None:
+        """Stop the multi-GPU worker pool, if one was started."""
+
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            self.model.stop_multi_process_pool(pool)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        """Encode documents into normalized embedding vectors.
+
+        With the embedding cache enabled only texts without a cached vector
+        (de-duplicated within the batch) reach the model. Rows are returned as
+        float32 arrays, which Chroma consumes without a Python-float round-trip.
+        """
+
+        texts: List[str] = [doc if isinstance(doc, str) else "" for doc in input]
+        if not texts:
+            return []
+        self._ensure_model()
+        cache = self._cache
+        if cache is None:
+            return list(np.asarray(self._run_model(texts), dtype=np.float32))
+
+        keys = [cache.key(t) for t in texts]
+        try:
+            vectors = cache.get_many(list(set(keys)))
+        except Exception as exc:
+            logger.warning(f"Embedding cache lookup failed: {exc}")
+            vectors = {}
+        misses: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in misses:
+                misses[key] = text
+        if misses:
+            # Return fresh vectors in stored form so hits and misses agree.
+            stored, blobs = cache.encode(self._run_model(list(misses.values())))
+            try:
+                cache.put_many(list(misses), stored, blobs)
+            except Exception as exc:
+                logger.warning(f"Embedding cache write failed: {exc}")
+            vectors.update(zip(misses, stored))
+        return [vectors[key] for key in keys]
+
+
+class QueryCache:
+    """LRU of query results keyed by query text, ``top_k`` and filter.
+
+    With ``similarity > 0`` a second, semantic tier returns the results of a
+    cached query with the same ``top_k`` and filter whose (normalized)
+    embedding has at least that cosine similarity to the new query's.
+    Cached results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize: int, similarity: float = 0.0):
+        self.maxsize = maxsize
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._results: OrderedDict[tuple, dict] = OrderedDict()
+        # Semantic tier: one preallocated row per cached vector, tagged with
+        # the id of its (top_k, filter) scope; -1 marks a free row.
+        self._matrix: Optional[np.ndarray] = None
+        self._row_scopes = np.full(maxsize, -1, dtype=np.int64)
+        self._row_keys: List[Optional[tuple]] = [None] * maxsize
+        self._rows: Dict[tuple, int] = {}
+        self._free_rows = list(range(maxsize - 1, -1, -1))
+        self._scope_ids: Dict[tuple, int] = {}
+        self._scope_counts: Dict[int, int] = {}
+        self._next_scope = 0
+
+    @staticmethod
+    def key(query_text: str, top_k: int, where: Optional[Dict[str, object]]) -> tuple:
+        """Return the exact-match key for a query."""
+
+        return (query_text, top_k, json.dumps(where, sort_keys=True) if where else "")
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """Return the cached results for ``key``, if any."""
+
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def get_similar(self, key: tuple, vector: np.ndarray) -> Optional[dict]:
+        """Return the results of the closest cached query under the same filter."""
+
+        if self.similarity <= 0:
+            return None
+        with self._lock:
+            scope = self._scope_ids.get(key[1:])
+            if scope is None or self._matrix is None:
+                return None
+            sims = self._matrix @ np.asarray(vector, dtype=np.float32)
+            sims[self._row_scopes != scope] = -np.inf
+            best = int(np.argmax(sims))
+            if sims[best] < self.similarity:
+                return None
+            cached = self._row_keys[best]
+            self._results.move_to_end(cached)
+            return self._results[cached]
+
+    def _store_vector(self, key: tuple, vector: np.ndarray) -> None:
+        """Write ``vector`` into the row for ``key``, claiming one if needed."""
+
+        row = self._rows.get(key)
+        if row is None:
+            row = self._free_rows.pop()
+            self._rows[key] = row
+            self._row_keys[row] = key
+            scope = self._scope_ids.get(key[1:])
+            if scope is None:
+                scope = self._scope_ids[key[1:]] = self._next_scope
+                self._next_scope += 1
+            self._scope_counts[scope] = self._scope_counts.get(scope, 0) + 1
+            self._row_scopes[row] = scope
+        if self._matrix is None:
+            self._matrix = np.zeros((self.maxsize, len(vector)), dtype=np.float32)
+        self._matrix[row] = vector
+
+    def _drop_vector(self, key: tuple) -> None:
+        """Release the row held by ``key``, if any."""
+
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        scope = int(self._row_scopes[row])
+        self._scope_counts[scope] -= 1
+        if not self._scope_counts[scope]:
+            del self._scope_counts[scope]
+            del self._scope_ids[key[1:]]
+        self._row_scopes[row] = -1
+        self._row_keys[row] = None
+        self._free_rows.append(row)
+
+    def put(self, key: tuple, result: dict, vector: Optional[np.ndarray] = None):
+        """Store ``result``, evicting the least recently used entries."""
+
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                evicted, _ = self._results.popitem(last=False)
+                self._drop_vector(evicted)
+            if vector is not None and self.similarity > 0 and key in self._results:
+                self._store_vector(key, vector)
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+
+        with self._lock:
+            self._results.clear()
+            for key in list(self._rows):
+                self._drop_vector(key)
+
+
+_shared_lock = threading.Lock()
+_clients: Dict[str, chromadb.ClientAPI] = {}
+_embedding_function: Optional[SentenceTransformerEmbeddingFunction] = None
+
+
+def _get_client(transport: str = CHROMA_TRANSPORT) -> chromadb.ClientAPI:
+    """Return the process-wide Chroma client for ``transport``, opening it once."""
+
+    with _shared_lock:
+        client = _clients.get(transport)
+        if client is None:
+            if transport == "http":
+                client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            elif transport == "persistent":
+                client = chromadb.PersistentClient(path=str(CHROMA_DIR))
+            else:
+                raise ValueError(f"Unknown Chroma transport: {transport!r}")
+            _clients[transport] = client
+        return client
+
+
+def _get_embedding_function() -> SentenceTransformerEmbeddingFunction:
+    """Return the process-wide embedding function, so model weights load once."""
+
+    global _embedding_function
+    with _shared_lock:
+        if _embedding_function is None:
+            _embedding_function = SentenceTransformerEmbeddingFunction()
+        return _embedding_function
 
 
 class VectorStore:
-    """High-level helper for upserting and querying Chroma collections."""
+    """High-level helper for upserting and querying Chroma collections.
 
-    def __init__(self, collection: str = "kb_chunks"):
-        self.client = chromadb.PersistentClient(path=str(CHROMA_DIR))
-        self.ef = SentenceTransformerEmbeddingFunction()
+    Instances share one Chroma client per transport and one embedding
+    function.
+    """
+
+    def __init__(
+        self, collection: str = "kb_chunks", transport: str = CHROMA_TRANSPORT
+    ):
+        self.collection = collection
+        self.transport = transport
+        self.client = _get_client(transport)
+        self.ef = _get_embedding_function()
         self.c = self.client.get_or_create_collection(
             name=collection,
             embedding_function=self.ef,
             metadata={"hnsw:space": "cosine"},
         )
+        self._query_cache: Optional[QueryCache] = None
+        if QUERY_CACHE_SIZE > 0:
+            self._query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_SIMILARITY)
+
+    def warmup(self) -> None:
+        """Run a throwaway embedding so first-batch cold-start costs are paid upfront."""
+
+        try:
+            self.ef(["warmup"])
+        except Exception as exc:
+            logger.warning(f"Embedding warmup failed: {exc}")
 
     def upsert(
         self, ids: IDs, documents: Documents, metadatas: Optional[Metadatas] = None
     ) -> None:
-        """Insert or update vectors, documents, and metadata."""
+        """Insert or update vectors, documents, and metadata.
+
+        Embeddings are computed here, through the embedding cache, and handed
+        to Chroma so it never runs the embedding function itself.
+        """
+
+        if not ids:
+            return
+        self.c.upsert(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=self.ef(list(documents)),
+        )
+        if self._query_cache is not None:
+            self._query_cache.clear()
 
-        self.c.upsert(ids=ids, documents=documents, metadatas=metadatas)
+    def sample_metadatas(self, limit: int = 100) -> List[dict]:
+        """Return the metadata of up to ``limit`` stored chunks."""
+
+        res = self.c.get(limit=limit, include=["metadatas"])
+        return [meta for meta in res.get("metadatas") or [] if meta]
 
     def query(
         self, query_text: str, top_k: int = 6, where: Optional[Dict[str, object]] = None
     ):
-        """Retrieve the top-k nearest chunks for a given query text."""
+        """Retrieve the top-k nearest chunks for a given query text.
+
+        Repeated queries are answered from the query cache; it is cleared on
+        ``upsert`` but not by writes from other processes.
+        """
+
+        cache = self._query_cache
+        key = QueryCache.key(query_text, top_k, where)
+        if cache is not None:
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+        embeddings = self.ef([query_text])
+        if cache is not None:
+            hit = cache.get_similar(key, embeddings[0])
+            if hit is not None:
+                return hit
+        result = self.c.query(
+            query_embeddings=embeddings,
+            n_results=top_k,
+            where=where,
+        )
+        if cache is not None:
+            cache.put(key, result, embeddings[0])
+        return result
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        top_k: int = 6,
+        where: Optional[Dict[str, object]] = None,
+    ):
+        """Retrieve the top-k chunks for several queries in one batch.
 
+        All queries are embedded in a single model pass and searched with a
+        single collection query; result lists are indexed like ``query_texts``.
+        """
+
+        if not query_texts:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": []}
         return self.c.query(
-            query_texts=[query_text],
+            query_embeddings=self.ef(query_texts),
             n_results=top_k,
             where=where,
         )
+
+
+class AsyncVectorStore:
+    """Write-side helper over Chroma's async HTTP client for bulk ingestion.
+
+    Embedding runs on a worker thread, so several batches can be embedded
+    and written to the server concurrently.
+    """
+
+    def __init__(self, client, collection, ef: SentenceTransformerEmbeddingFunction):
+        self.client = client
+        self.c = collection
+        self.ef = ef
+
+    @classmethod
+    async def connect(
+        cls,
+        collection: str = "kb_chunks",
+        host: str = CHROMA_HOST,
+        port: int = CHROMA_PORT,
+    ) -> "AsyncVectorStore":
+        """Connect to a Chroma server and open (or create) ``collection``."""
+
+        ef = _get_embedding_function()
+        client = await chromadb.AsyncHttpClient(host=host, port=port)
+        c = await client.get_or_create_collection(
+            name=collection,
+            embedding_function=ef,
+            metadata={"hnsw:space": "cosine"},
+        )
+        return cls(client, c, ef)
+
+    async def upsert(
+        self, ids: IDs, documents: Documents, metadatas: Optional[Metadatas] = None
+    ) -> None:
+        """Embed documents off the event loop and upsert them with their vectors."""
+
+        if not ids:
+            return
+        embeddings = await asyncio.to_thread(self.ef, list(documents))
+        await self.c.upsert(
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            embeddings=embeddings,
+        )
+
+    async def upsert_batches(
+        self,
+        batches: AsyncIterable[Tuple[IDs, Documents, Optional[Metadatas]]],
+        max_in_flight: int = 8,
+    ) -> int:
+        """Upsert ``(ids, documents, metadatas)`` batches concurrently.
+
+        Batches are consumed as they arrive and at most ``max_in_flight`` are
+        pending at once; failed batches are logged and skipped. Returns the
+        number of chunks written.
+        """
+
+        semaphore = asyncio.Semaphore(max(1, max_in_flight))
+        pending: set = set()
+        written = 0
+
+        async def _one(ids: IDs, docs: Documents, metas: Optional[Metadatas]) -> None:
+            nonlocal written
+            try:
+                await self.upsert(ids=ids, documents=docs, metadatas=metas)
+                logger.info(f"Indexed batch of {len(ids)} chunks")
+                written += len(ids)
+            except Exception as e:
+                logger.error(
+                    f"Vector upsert failed for batch of {len(ids)} chunks: {e}"
+                )
+            finally:
+                semaphore.release()
+
+        async for ids, docs, metas in batches:
+            await semaphore.acquire()
+            task = asyncio.create_task(_one(ids, docs, metas))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+        return written
+
+
+class FaissVectorStore:
+    """Faiss HNSW index over int8 scalar-quantized vectors, a ``VectorStore`` sibling.
+
+    Vectors take a quarter of Chroma's fp32 footprint and are compared with
+    inner product, which equals cosine similarity for the normalized
+    embeddings. Documents and metadata live in a SQLite table keyed by the
+    faiss label. HNSW cannot delete, so re-upserted ids leave stale vectors
+    behind that queries skip. The index is written by ``save`` (also at
+    exit); readers see new vectors only after reopening it.
+
+    SQLite is the source of truth: each saved index file is tagged with a
+    generation recorded in the same database, and if rows were committed
+    after the last save (e.g. the process died before writing the index),
+    the index is rebuilt from the stored documents on open.
+
+    ``where`` filters are evaluated against per-label boolean masks (cached
+    per clause) and handed to faiss as a packed bitmap, so the search only
+    returns matching chunks.
+    """
+
+    _EXACT_FILTER_MAX = 4096
+    _MASK_CACHE_SIZE = 1024
+    _REBUILD_BATCH = 256
+
+    def __init__(
+        self,
+        collection: str = "kb_chunks",
+        directory: Path = FAISS_DIR,
+        m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+    ):
+        if faiss is None:
+            raise RuntimeError("FaissVectorStore requires the faiss package")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.collection = collection
+        self.ef = _get_embedding_function()
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.index = None
+        self.conn = sqlite3.connect(
+            str(self.directory / f"{collection}.sqlite"), check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (label INTEGER PRIMARY KEY,"
+            " id TEXT NOT NULL, document TEXT, metadata_json TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks(id)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)"
+        )
+        self.conn.commit()
+        index_path = self._index_path(self._generation())
+        if index_path.exists():
+            self.index = faiss.read_index(str(index_path))
+            self.index.hnsw.efSearch = ef_search
+        (max_label,) = self.conn.execute("SELECT MAX(label) FROM chunks").fetchone()
+        if max_label is not None and max_label >= self._ntotal():
+            self._rebuild()
+        ntotal = self._ntotal()
+        self._metas: List[Optional[dict]] = [None] * ntotal
+        self._alive = np.zeros(ntotal, dtype=bool)
+        for label, meta_json in self.conn.execute(
+            "SELECT label, metadata_json FROM chunks"
+        ):
+            self._metas[label] = json.loads(meta_json) if meta_json else {}
+            self._alive[label] = True
+        self._eq_masks: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._numeric: Dict[str, np.ndarray] = {}
+        atexit.register(self.save)
+
+    def _generation(self) -> int:
+        """Return the generation of the last index file written by ``save``."""
+
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE key = 'generation'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _index_path(self, generation: int) -> Path:
+        """Return the index file written for ``generation``."""
+
+        return self.directory / f"{self.collection}-{generation:06d}.index"
+
+    def _write_index(self, rows: Optional[List[tuple]] = None) -> None:
+        """Write the index as a new generation and record it in SQLite.
+
+        ``rows`` (``(label, id, document, metadata_json)``) replace the chunk
+        table in the same transaction, so the table and the recorded index
+        can never disagree.
+        """
+
+        generation = self._generation() + 1
+        path = self._index_path(generation)
+        faiss.write_index(self.index, str(path))
+        with self.conn:
+            if rows is not None:
+                self.conn.execute("DELETE FROM chunks")
+                self.conn.executemany(
+                    "INSERT INTO chunks(label, id, document, metadata_json)"
+                    " VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO state(key, value) VALUES ('generation', ?)",
+                (generation,),
+            )
+        for old in self.directory.glob(f"{self.collection}-*.index"):
+            if old != path:
+                old.unlink(missing_ok=True)
+        self._dirty = False
+
+    def _rebuild(self) -> None:
+        """Re-embed every stored chunk into a fresh, compactly labelled index."""
+
+        rows = self.conn.execute(
+            "SELECT id, document, metadata_json FROM chunks ORDER BY label"
+        ).fetchall()
+        logger.warning(
+            "Faiss index for %s is behind its %d stored chunks; rebuilding",
+            self.collection,
+            len(rows),
+        )
+        self.index = None
+        for i in range(0, len(rows), self._REBUILD_BATCH):
+            batch = rows[i : i + self._REBUILD_BATCH]
+            vectors = np.ascontiguousarray(
+                np.stack(self.ef([document or "" for _, document, _ in batch]))
+            )
+            if self.index is None:
+                self._create_index(vectors.shape[1])
+            self.index.add(vectors)
+        self._write_index(
+            [(label, *row) for label, row in enumerate(rows)] if rows else []
+        )
+
+    def _ntotal(self) -> int:
+        """Return the number of vectors in the index, including stale ones."""
+
+        return self.index.ntotal if self.index is not None else 0
+
+    def _create_index(self, dim: int) -> None:
+        """Build an empty index whose quantizer covers the range [-1, 1].
+
+        Every component of a normalized embedding lies in that range, so
+        training on it, rather than on the first batch, never clips.
+        """
+
+        index = faiss.IndexHNSWSQ(
+            dim,
+            faiss.ScalarQuantizer.QT_8bit,
+            self.m,
+            faiss.METRIC_INNER_PRODUCT,
+        )
+        index.hnsw.efConstruction = self.ef_construction
+        index.hnsw.efSearch = self.ef_search
+        index.train(
+            np.stack([np.full(dim, -1.0), np.full(dim, 1.0)]).astype(np.float32)
+        )
+        self.index = index
+
+    def warmup(self) -> None:
+        """Run a throwaway embedding so first-batch cold-start costs are paid upfront."""
+
+        try:
+            self.ef(["warmup"])
+        except Exception as exc:
+            logger.warning(f"Embedding warmup failed: {exc}")
+
+    def upsert(
+        self, ids: IDs, documents: Documents, metadatas: Optional[Metadatas] = None
+    ) -> None:
+        """Insert or replace vectors, documents, and metadata."""
+
+        if not ids:
+            return
+        vectors = np.ascontiguousarray(np.stack(self.ef(list(documents))))
+        metas = [dict(meta or {}) for meta in (metadatas or [None] * len(ids))]
+        with self._lock:
+            if self.index is None:
+                self._create_index(vectors.shape[1])
+            start = self._ntotal()
+            replaced: List[int] = []
+            # Rows are committed before the vectors are added; if the process
+            # dies before the next save, the index is rebuilt from them.
+            with self.conn:
+                for i in range(0, len(ids), 500):
+                    chunk = list(ids[i : i + 500])
+                    marks = ",".join("?" * len(chunk))
+                    replaced.extend(
+                        label
+                        for (label,) in self.conn.execute(
+                            f"SELECT label FROM chunks WHERE id IN ({marks})", chunk
+                        )
+                    )
+                    self.conn.execute(
+                        f"DELETE FROM chunks WHERE id IN ({marks})", chunk
+                    )
+                self.conn.executemany(
+                    "INSERT INTO chunks(label, id, document, metadata_json)"
+                    " VALUES (?, ?, ?, ?)",
+                    [
+                        (start + i, id_, doc, json.dumps(meta) if meta else None)
+                        for i, (id_, doc, meta) in enumerate(zip(ids, documents, metas))
+                    ],
+                )
+            self.index.add(vectors)
+            self._dirty = True
+            for label in replaced:
+                self._alive[label] = False
+                self._metas[label] = None
+            self._metas.extend(metas)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for (key, value, is_bool), mask in list(self._eq_masks.items()):
+                self._eq_masks[key, value, is_bool] = np.concatenate(
+                    [mask, self._eq_column(metas, key, value)]
+                )
+            for key, column in list(self._numeric.items()):
+                self._numeric[key] = np.concatenate(
+                    [column, self._numeric_column(metas, key)]
+                )
+
+    @staticmethod
+    def _eq_column(metas: List[Optional[dict]], key: str, value) -> np.ndarray:
+        """Return which of ``metas`` have ``key`` equal to ``value``.
+
+        As in Chroma, a bool never equals a number, although ``True == 1``
+        in Python.
+        """
+
+        is_bool = isinstance(value, bool)
+        return np.fromiter(
+            (
+                meta is not None
+                and meta.get(key) == value
+                and isinstance(meta.get(key), bool) == is_bool
+                for meta in metas
+            ),
+            dtype=bool,
+            count=len(metas),
+        )
+
+    @staticmethod
+    def _numeric_column(metas: List[Optional[dict]], key: str) -> np.ndarray:
+        """Return ``key`` of each of ``metas`` as float64, NaN when not numeric."""
+
+        def _value(meta: Optional[dict]) -> float:
+            value = meta.get(key) if meta else None
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+            return np.nan
+
+        return np.fromiter(map(_value, metas), dtype=np.float64, count=len(metas))
+
+    def _eq_mask(self, key: str, value) -> np.ndarray:
+        """Return the cached mask of labels whose ``key`` equals ``value``."""
+
+        # True and 1 hash alike, so the cache key records which one it is.
+        cache_key = (key, value, isinstance(value, bool))
+        mask = self._eq_masks.get(cache_key)
+        if mask is None:
+            mask = self._eq_column(self._metas, key, value)
+            self._eq_masks[cache_key] = mask
+            if len(self._eq_masks) > self._MASK_CACHE_SIZE:
+                self._eq_masks.popitem(last=False)
+        else:
+            self._eq_masks.move_to_end(cache_key)
+        return mask
+
+    def _compare_mask(self, key: str, op: str, value) -> np.ndarray:
+        """Evaluate one ``{key: {op: value}}`` condition over all labels."""
+
+        if op == "$eq":
+            return self._eq_mask(key, value)
+        if op == "$ne":
+            return ~self._eq_mask(key, value)
+        if op in ("$in", "$nin"):
+            mask = np.zeros(len(self._metas), dtype=bool)
+            for item in value:
+                mask |= self._eq_mask(key, item)
+            return mask if op == "$in" else ~mask
+        column = self._numeric.get(key)
+        if column is None:
+            column = self._numeric[key] = self._numeric_column(self._metas, key)
+        with np.errstate(invalid="ignore"):
+            if op == "$gt":
+                return column > value
+            if op == "$gte":
+                return column >= value
+            if op == "$lt":
+                return column < value
+            if op == "$lte":
+                return column <= value
+        raise ValueError(f"Unsupported where operator: {op}")
+
+    def _where_mask(self, where: Dict[str, object]) -> np.ndarray:
+        """Evaluate a Chroma-style ``where`` filter into a boolean label mask."""
+
+        mask = np.ones(len(self._metas), dtype=bool)
+        for key, cond in where.items():
+            if key in ("$and", "$or"):
+                parts = [self._where_mask(clause) for clause in cond]
+                if key == "$and":
+                    mask &= np.logical_and.reduce(parts)
+                else:
+                    mask &= np.logical_or.reduce(parts)
+            elif isinstance(cond, dict):
+                for op, value in cond.items():
+                    mask &= self._compare_mask(key, op, value)
+            else:
+                mask &= self._eq_mask(key, cond)
+        return mask
+
+    def _search(self, vectors: np.ndarray, top_k: int, where):
+        """Search under the lock, restricted to live labels matching ``where``."""
+
+        ntotal = self._ntotal()
+        allowed = self._alive
+        if where:
+            allowed = allowed & self._where_mask(where)
+        n_allowed = int(np.count_nonzero(allowed))
+        k = min(top_k, n_allowed)
+        if not k:
+            return None
+        if n_allowed == ntotal:
+            return self.index.search(vectors, k)
+        bitmap = np.packbits(allowed, bitorder="little")
+        selector = faiss.IDSelectorBitmap(bitmap)
+        if n_allowed <= self._EXACT_FILTER_MAX:
+            # Few matches: scan the quantized codes exactly instead of
+            # walking a graph that is mostly filtered out.
+            storage = faiss.downcast_index(self.index.storage)
+            return storage.search(
+                vectors, k, params=faiss.SearchParameters(sel=selector)
+            )
+        params = faiss.SearchParametersHNSW(
+            sel=selector, efSearch=max(self.ef_search, k)
+        )
+        return self.index.search(vectors, k, params=params)
+
+    def sample_metadatas(self, limit: int = 100) -> List[dict]:
+        """Return the metadata of up to ``limit`` stored chunks."""
+
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT metadata_json FROM chunks WHERE metadata_json IS NOT NULL"
+                " LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [json.loads(meta_json) for (meta_json,) in rows]
+
+    def query(
+        self, query_text: str, top_k: int = 6, where: Optional[Dict[str, object]] = None
+    ):
+        """Retrieve the top-k nearest chunks for a given query text."""
+
+        return self.query_many([query_text], top_k=top_k, where=where)
+
+    def query_many(
+        self,
+        query_texts: List[str],
+        top_k: int = 6,
+        where: Optional[Dict[str, object]] = None,
+    ):
+        """Retrieve the top-k chunks for several queries, shaped like Chroma's results."""
+
+        out: Dict[str, list] = {
+            "ids": [],
+            "documents": [],
+            "metadatas": [],
+            "distances": [],
+        }
+        if not query_texts:
+            return out
+        vectors = np.ascontiguousarray(np.stack(self.ef(query_texts)))
+        with self._lock:
+            found = None
+            if self.index is not None:
+                found = self._search(vectors, top_k, where)
+            if found is None:
+                for key in out:
+                    out[key] = [[] for _ in query_texts]
+                return out
+            scores, labels = found
+            wanted = sorted({int(label) for label in labels.ravel() if label >= 0})
+            rows = {}
+            for i in range(0, len(wanted), 500):
+                chunk = wanted[i : i + 500]
+                rows.update(
+                    (row[0], row[1:])
+                    for row in self.conn.execute(
+                        "SELECT label, id, document, metadata_json FROM chunks"
+                        f" WHERE label IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+        for row_scores, row_labels in zip(scores, labels):
+            hits = [
+                (rows[label], score)
+                for label, score in zip(row_labels.tolist(), row_scores.tolist())
+                if label in rows
+            ]
+            out["ids"].append([row[0] for row, _ in hits])
+            out["documents"].append([row[1] for row, _ in hits])
+            out["metadatas"].append(
+                [json.loads(row[2]) if row[2] else None for row, _ in hits]
+            )
+            out["distances"].append([1.0 - score for _, score in hits])
+        return out
+
+    def save(self) -> None:
+        """Write the index to disk if it changed since the last save."""
+
+        with self._lock:
+            if self.index is None or not self._dirty:
+                return
+            self._write_index()
+
+
+def open_vector_store(collection: str = "kb_chunks"):
+    """Return the vector store selected by ``VECTOR_BACKEND``."""
+
+    if VECTOR_BACKEND == "faiss":
+        return FaissVectorStore(collection)
+    if VECTOR_BACKEND != "chroma":
+        raise ValueError(f"Unknown vector backend: {VECTOR_BACKEND!r}")
+    return VectorStore(collection)